@@ -1,50 +1,141 @@
+import time
+SCRIPT_START = time.perf_counter()
+
+import json
+import os
+import queue
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import requests
-import time
 from streamlit_lottie import st_lottie
 from src.data_processing import load_and_prepare_data
-from src.llm_integration import load_base_model_and_tokenizer, create_langchain_llm
+from src.filter_index import build_book_index, build_filter_index, book_slice, filter_rows, category_options_for_author, sort_by_title
+from src.aggregates import build_aggregates, book_summary_table, genre_top_books
+from src.trends import build_trend_store, query_trend, store_months
 from src.analysis import generate_book_analysis_langchain, generate_follow_up_answer
+from src.llm_worker import MAX_BATCH_SIZE, LLMWorker
+from src.profiling import PROFILE_LOG_PATH, profiling_enabled, recent_stages, set_profiling_scope, stage
+
+LOTTIE_URL = "https://lottie.host/890b53c7-2484-486a-8488-ab91223513b3/u9C3GA3f6T.json"
+# Cópia local da animação: usada se existir, e gravada após o primeiro download bem-sucedido.
+LOTTIE_PATH = "assets/welcome_lottie.json"
+LOTTIE_TIMEOUT_S = 3
+# Orçamento da primeira renderização completa (imports + dados + modelo), em segundos.
+STARTUP_BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "10"))
+DEBUG_PANEL_ROWS = 30
+DEBUG_PANEL_COLUMNS = ['stage', 'wall_s', 'rss_delta_mb', 'peak_rss_delta_mb', 'rows', 'prompt_tokens', 'generated_tokens']
 
 st.set_page_config(page_title="Dashboard de Insights da Editora", page_icon="📚", layout="wide")
 
 @st.cache_data
 def cached_load_data():
-    return load_and_prepare_data(use_sample=True) 
+    df = load_and_prepare_data(use_sample=True)
+    # Agregados antes da ordenação, para manter os desempates dos rankings na ordem original das avaliações.
+    aggregates = build_aggregates(df)
+    trend_store = build_trend_store(df, use_sample=True)
+    # Com as avaliações de cada livro contíguas, a fatia de um livro não copia dados.
+    df = sort_by_title(df)
+    return df, build_filter_index(df), build_book_index(df), aggregates, trend_store
 
 @st.cache_resource
-def cached_load_llm():
-    model, tokenizer = load_base_model_and_tokenizer()
-    llm = create_langchain_llm(model, tokenizer)
+def cached_load_llm(backend):
+    # Import tardio: torch, transformers e bitsandbytes só são carregados quando o LLM é habilitado.
+    from src.llm_integration import load_base_model_and_tokenizer, create_langchain_llm
+    model, tokenizer = load_base_model_and_tokenizer(backend=backend)
+    # Nos backends com pipeline, os lotes do worker são gerados juntos (padding à esquerda).
+    llm = create_langchain_llm(model, tokenizer, batch_size=MAX_BATCH_SIZE, backend=backend)
     return llm
 
-def load_lottieurl(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
+@st.cache_resource
+def cached_llm_worker(backend):
+    # Um único worker por servidor, dono do modelo, atende os pedidos de todas as sessões.
+    return LLMWorker(cached_load_llm(backend))
+
+def wait_for_job(future, token_queue, render):
+    """Mostra o texto parcial que o worker envia até o pedido terminar e retorna o resultado."""
+    while not future.done() or not token_queue.empty():
+        try:
+            render(token_queue.get(timeout=0.1))
+        except queue.Empty:
+            continue
+    return future.result()
+
+def load_lottieurl(url: str, path: str):
+    try:
+        r = requests.get(url, timeout=LOTTIE_TIMEOUT_S)
+        if r.status_code != 200:
+            return None
+        lottie_json = r.json()
+    except (requests.RequestException, ValueError):
         return None
-    return r.json()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(lottie_json, f)
+    except OSError:
+        pass
+    return lottie_json
+
+@st.cache_resource
+def lottie_download():
+    """Future do download da animação de boas-vindas (com timeout), em segundo plano."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    return executor.submit(load_lottieurl, LOTTIE_URL, LOTTIE_PATH)
+
+def render_lottie(placeholder):
+    """
+    Mostra a animação de boas-vindas em `placeholder`: da cópia local, lida
+    na hora, ou do download em segundo plano, se já terminou. Retorna True se
+    a animação foi mostrada (ou não há mais o que esperar).
+    """
+    if os.path.exists(LOTTIE_PATH):
+        try:
+            with open(LOTTIE_PATH, encoding='utf-8') as f:
+                lottie_json = json.load(f)
+        except (OSError, ValueError):
+            lottie_json = None
+    else:
+        download = lottie_download()
+        if not download.done():
+            return False
+        lottie_json = download.result()
+    if lottie_json:
+        with placeholder:
+            st_lottie(lottie_json, speed=1, width=250, height=250)
+    return True
 
 if 'data_loaded' not in st.session_state:
     st.header("📚 Bem-vindo(a) ao Dashboard de Insights da Editora", anchor=False)
     st.markdown("---")
     
-    lottie_url = "https://lottie.host/890b53c7-2484-486a-8488-ab91223513b3/u9C3GA3f6T.json"
-    lottie_json = load_lottieurl(lottie_url)
-    if lottie_json:
-        st_lottie(lottie_json, speed=1, width=250, height=250)
+    lottie_placeholder = st.empty()
+    lottie_shown = render_lottie(lottie_placeholder)
 
     with st.status("Iniciando processo...", expanded=True) as status:
         status.update(label="Carregando e processando avaliações...")
-        df = cached_load_data()
+        df, filter_index, book_index, aggregates, trend_store = cached_load_data()
         st.session_state['data'] = df
+        st.session_state['filter_index'] = filter_index
+        st.session_state['book_index'] = book_index
+        st.session_state['aggregates'] = aggregates
+        st.session_state['trend_store'] = trend_store
+        if not lottie_shown:
+            # O download começou junto com a carga dos dados; se já terminou, a animação aparece agora.
+            render_lottie(lottie_placeholder)
         
         status.update(label="Preparando modelo de Inteligência Artificial...")
-        llm = None #cached_load_llm() #Usar a GPU
-        st.session_state['llm'] = llm
+        # LLM_BACKEND=cuda_fp16, cuda_4bit ou cpu_int8 habilita o modelo (desligado por padrão).
+        llm_worker = cached_llm_worker(os.environ["LLM_BACKEND"]) if os.getenv("LLM_BACKEND") else None
+        st.session_state['llm_worker'] = llm_worker
+        st.session_state['llm'] = llm_worker.llm if llm_worker else None
         
         status.update(label="Tudo pronto! Bem-vindo(a) ao Dashboard.", state="complete", expanded=False)
 
-    time.sleep(1) 
+    startup_time = time.perf_counter() - SCRIPT_START
+    print(f"Inicialização em {startup_time:.2f}s (orçamento: {STARTUP_BUDGET_S:.0f}s)")
+    if startup_time > STARTUP_BUDGET_S:
+        print(f"Aviso: inicialização {startup_time - STARTUP_BUDGET_S:.2f}s acima do orçamento.")
     st.session_state['data_loaded'] = True
     st.session_state.analysis_results = None
     st.session_state.messages = []
@@ -52,7 +143,12 @@ if 'data_loaded' not in st.session_state:
 
 else:
     df = st.session_state['data']
+    filter_index = st.session_state['filter_index']
+    book_index = st.session_state['book_index']
+    aggregates = st.session_state['aggregates']
+    trend_store = st.session_state['trend_store']
     llm = st.session_state['llm']
+    llm_worker = st.session_state['llm_worker']
 
     st.title("📚 Dashboard de Insights da Editora")
     st.markdown("Uma ferramenta para automatizar a análise de avaliações de livros.")
@@ -67,42 +163,47 @@ else:
         st.session_state.analysis_results = None 
         st.session_state.messages = []
 
-    all_authors = sorted(df.explode('authors')['authors'].unique())
-    author_options = [author_placeholder] + all_authors
+    author_options = [author_placeholder] + filter_index['authors']['options']
     selected_author = st.sidebar.selectbox("1. Selecione um Autor (Opcional)", options=author_options, key="author_selector")
 
     if selected_author != author_placeholder:
-        author_df = df[df['authors'].apply(lambda authors_list: selected_author in authors_list)]
-        category_options = [category_placeholder] + sorted(author_df.explode('categories')['categories'].unique())
+        category_options = [category_placeholder] + category_options_for_author(filter_index, selected_author)
     else:
-        all_categories = sorted(df.explode('categories')['categories'].unique())
-        category_options = [category_placeholder] + all_categories
+        category_options = [category_placeholder] + filter_index['categories']['options']
         
     selected_category = st.sidebar.selectbox("2. Selecione uma Categoria (Opcional)", options=category_options, key="category_selector")
     st.sidebar.button("Limpar Filtros", on_click=clear_filters)
+    debug_mode = st.sidebar.checkbox("Modo de depuração", value=profiling_enabled(), key="debug_mode",
+                                     help="Mede o tempo e a memória de cada etapa desta sessão.")
+    # Só nesta sessão: o escopo vale para a thread que roda o script e para os pedidos enviados ao worker.
+    session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+    set_profiling_scope(debug_mode, session_id)
+
+    if llm_worker:
+        worker_stats = llm_worker.stats()
+        latency = worker_stats['avg_latency_s']
+        st.sidebar.caption(
+            f"Fila do modelo: {worker_stats['queue_depth']} pedido(s) · "
+            f"latência média: {f'{latency:.1f}s' if latency is not None else '—'}"
+        )
     
-    tab1, tab2, tab3 = st.tabs(["Análise de Livros", "Análise de Usuários", "Análise de Gêneros"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Análise de Livros", "Análise de Usuários", "Análise de Gêneros", "Tendências"])
 
     with tab1:
         st.header("Livros Encontrados")
         
-        filtered_df = df.copy()
-        if selected_author != author_placeholder:
-            filtered_df = filtered_df[filtered_df['authors'].apply(lambda authors_list: selected_author in authors_list)]
-        if selected_category != category_placeholder:
-            filtered_df = filtered_df[filtered_df['categories'].apply(lambda cat_list: selected_category in cat_list)]
+        with stage('tab_books_filter') as record:
+            filtered_rows = filter_rows(
+                filter_index,
+                author=selected_author if selected_author != author_placeholder else None,
+                category=selected_category if selected_category != category_placeholder else None
+            )
+            record['rows'] = len(filtered_rows) if filtered_rows is not None else len(df)
 
-        if not filtered_df.empty and (selected_author != author_placeholder or selected_category != category_placeholder):
-            
-            agg_df = filtered_df.copy()
-            agg_df['authors_str'] = agg_df['authors'].apply(lambda x: ', '.join(map(str, x)))
-            agg_df['categories_str'] = agg_df['categories'].apply(lambda x: ', '.join(map(str, x)))
+        if filtered_rows is not None and len(filtered_rows):
             
-            summary_df = agg_df.groupby(['Title', 'authors_str']).agg(
-                categories=('categories_str', lambda s: ', '.join(s.unique())),
-                avg_score=('score', 'mean'),
-                num_reviews=('Id', 'count')
-            ).reset_index().sort_values(by='num_reviews', ascending=False)
+            with stage('tab_books_table', rows=len(filtered_rows)):
+                summary_df = book_summary_table(df, book_index, filtered_rows)
             
             st.dataframe(summary_df.rename(columns={
                 'Title': 'Título', 'authors_str': 'Autores', 'categories': 'Categorias', 
@@ -121,8 +222,18 @@ else:
                 st.session_state.messages = [] 
                 st.session_state.current_book_title = selected_book_for_analysis
                 with st.spinner(f"A IA está analisando as avaliações..."):
-                    book_df = df[df['Title'] == selected_book_for_analysis].copy()
-                    st.session_state.analysis_results = generate_book_analysis_langchain(book_df, selected_book_for_analysis, llm)
+                    book_df = book_slice(df, book_index, selected_book_for_analysis)
+                    stream_placeholder = st.empty()
+                    render_partial = lambda text: stream_placeholder.code(text + "▌", language="json")
+                    if llm_worker:
+                        token_queue = queue.Queue()
+                        future = llm_worker.submit_summary(book_df, selected_book_for_analysis, on_token=token_queue.put)
+                        st.session_state.analysis_results = wait_for_job(future, token_queue, render_partial)
+                    else:
+                        st.session_state.analysis_results = generate_book_analysis_langchain(
+                            book_df, selected_book_for_analysis, llm, on_token=render_partial
+                        )
+                    stream_placeholder.empty()
             
             if st.session_state.analysis_results:
                 results = st.session_state.analysis_results
@@ -160,10 +271,19 @@ else:
                         st.markdown(user_question)
 
                     with st.chat_message("assistant"):
+                        response_placeholder = st.empty()
                         with st.spinner("Pensando..."):
-                            book_df = df[df['Title'] == current_book_title].copy()
-                            response = generate_follow_up_answer(book_df, current_book_title, user_question, llm)
-                            st.markdown(response)
+                            book_df = book_slice(df, book_index, current_book_title)
+                            render_partial = lambda text: response_placeholder.markdown(text + "▌")
+                            if llm_worker:
+                                token_queue = queue.Queue()
+                                future = llm_worker.submit_follow_up(book_df, current_book_title, user_question, on_token=token_queue.put)
+                                response = wait_for_job(future, token_queue, render_partial)
+                            else:
+                                response = generate_follow_up_answer(
+                                    book_df, current_book_title, user_question, llm, on_token=render_partial
+                                )
+                        response_placeholder.markdown(response)
                     
                     st.session_state.messages.append({"role": "assistant", "content": response})
                     st.rerun()
@@ -181,13 +301,13 @@ else:
             "Classificar usuários por:",
             options=["Maior Número de Avaliações", "Maiores Fãs (Melhor Nota Média)", "Maiores Críticos (Pior Nota Média)"]
         )
-        unique_users_df = df.drop_duplicates(subset=['User_id']).copy()
+        user_rankings = aggregates['users']['rankings']
         if sort_by == "Maior Número de Avaliações":
-            top_users = unique_users_df.nlargest(20, 'user_review_count')
+            top_users = user_rankings['most_reviews']
         elif sort_by == "Maiores Fãs (Melhor Nota Média)":
-            top_users = unique_users_df.nlargest(20, 'user_avg_score')
+            top_users = user_rankings['best_avg_score']
         else:
-            top_users = unique_users_df.nsmallest(20, 'user_avg_score')
+            top_users = user_rankings['worst_avg_score']
         st.subheader(f"Top 20 Usuários: {sort_by}")
         st.dataframe(
             top_users[['profileName', 'user_review_count', 'user_avg_score']],
@@ -202,19 +322,20 @@ else:
         
         st.subheader("Visão Geral dos Gêneros")
         
-        exploded_categories = df.explode('categories')
+        genre_tables = aggregates['genres']
+        genre_overview = genre_tables['overview']
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            unique_genres = exploded_categories['categories'].nunique()
+            unique_genres = genre_overview['unique_genres']
             st.metric("Total de Gêneros Únicos", unique_genres)
         
         with col2:
-            avg_books_per_genre = round(exploded_categories['categories'].value_counts().mean(), 1)
+            avg_books_per_genre = round(genre_overview['avg_rows_per_genre'], 1)
             st.metric("Média de Livros por Gênero", avg_books_per_genre)
         
         with col3:
-            avg_score_per_genre = round(exploded_categories.groupby('categories')['score'].mean().mean(), 2)
+            avg_score_per_genre = round(genre_overview['avg_score_per_genre'], 2)
             st.metric("Nota Média Geral dos Gêneros", f"{avg_score_per_genre}/5.0")
         
         st.subheader("Ranking de Gêneros")
@@ -225,18 +346,19 @@ else:
             key="genre_metric"
         )
         
+        genre_rankings = genre_tables['rankings']
         if metric_choice == "Maior Número de Livros":
-            genre_stats = exploded_categories['categories'].value_counts().reset_index()
+            genre_stats = genre_rankings['num_rows'].head(20).reset_index()
             genre_stats.columns = ['Gênero', 'Número de Livros']
         elif metric_choice == "Melhor Avaliação Média":
-            genre_stats = exploded_categories.groupby('categories')['score'].mean().sort_values(ascending=False).reset_index()
+            genre_stats = genre_rankings['avg_score'].head(20).reset_index()
             genre_stats.columns = ['Gênero', 'Nota Média']
         else:
-            genre_stats = exploded_categories.groupby('categories')['Id'].count().sort_values(ascending=False).reset_index()
+            genre_stats = genre_rankings['num_reviews'].head(20).reset_index()
             genre_stats.columns = ['Gênero', 'Total de Avaliações']
         
         st.dataframe(
-            genre_stats.head(20),
+            genre_stats,
             use_container_width=True,
             height=400
         )
@@ -245,36 +367,32 @@ else:
         
         selected_genre = st.selectbox(
             "Selecione um gênero para análise detalhada:",
-            options=sorted(exploded_categories['categories'].unique()),
+            options=filter_index['categories']['options'],
             key="genre_selector"
         )
         
         if selected_genre:
-            genre_df = exploded_categories[exploded_categories['categories'] == selected_genre]
+            genre_summary = genre_tables['genres'].loc[selected_genre]
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total de Livros", genre_df['Title'].nunique())
+                st.metric("Total de Livros", int(genre_summary['num_books']))
             with col2:
-                st.metric("Total de Avaliações", len(genre_df))
+                st.metric("Total de Avaliações", int(genre_summary['num_rows']))
             with col3:
-                avg_score = genre_df['score'].mean()
+                avg_score = genre_summary['avg_score']
                 st.metric("Nota Média", f"{avg_score:.2f}/5.0")
             with col4:
-                st.metric("Autores Diferentes", genre_df['authors'].explode().nunique())
+                st.metric("Autores Diferentes", int(genre_summary['num_authors']))
             
             st.divider()
             
             st.subheader(f"Top Livros do Gênero '{selected_genre}'")
             
-            top_books = genre_df.groupby('Title').agg(
-                Autores=('authors', lambda x: ', '.join(set([a for sublist in x for a in sublist]))),
-                Nota_Média=('score', 'mean'),
-                N_Avaliações=('Id', 'count')
-            ).sort_values('N_Avaliações', ascending=False).head(10)
+            top_books = genre_top_books(aggregates, selected_genre)
             
             st.dataframe(
-                top_books.reset_index(),
+                top_books,
                 column_config={
                     "Title": "Título",
                     "Autores": "Autores",
@@ -283,4 +401,52 @@ else:
                 },
                 use_container_width=True
             )
-                    
\ No newline at end of file
+                    
+
+    with tab4:
+        st.header("📈 Tendências ao Longo do Tempo")
+        st.markdown("Acompanhe o volume de avaliações e a nota média de um livro, autor ou gênero por período.")
+
+        if not trend_store:
+            st.warning("As tendências não estão disponíveis: não foi possível gravar os dados por período.")
+        else:
+            dimension_labels = {"Livro": "book", "Autor": "author", "Gênero": "category"}
+            period_labels = {"Mês": "month", "Trimestre": "quarter", "Ano": "year"}
+
+            col1, col2 = st.columns(2)
+            with col1:
+                dimension_choice = st.selectbox("Analisar tendência de:", options=list(dimension_labels), key="trend_dimension")
+            with col2:
+                period_choice = st.selectbox("Agrupar por:", options=list(period_labels), key="trend_period")
+
+            dimension = dimension_labels[dimension_choice]
+            if dimension == "book":
+                label_options = aggregates['books'].index
+            else:
+                label_options = filter_index['authors' if dimension == "author" else 'categories']['options']
+            selected_label = st.selectbox(f"Selecione o {dimension_choice.lower()}:", options=label_options, key="trend_label")
+
+            months = store_months(trend_store)
+            if selected_label and months:
+                start, end = st.select_slider("Período:", options=months, value=(months[0], months[-1]), key="trend_range")
+                with stage('tab_trends', dimension=dimension, period=period_labels[period_choice]) as record:
+                    trend = query_trend(trend_store, dimension, selected_label, start, end, period_labels[period_choice])
+                    record['rows'] = len(trend)
+
+                if trend.empty:
+                    st.info("Nenhuma avaliação no período selecionado.")
+                else:
+                    col1, col2 = st.columns(2)
+                    col1.metric("Avaliações no Período", f"{trend['num_reviews'].sum()}")
+                    col2.metric("Nota Média no Período", f"{(trend['avg_score'] * trend['num_reviews']).sum() / trend['num_reviews'].sum():.2f}/5.0")
+
+                    st.subheader("Nota Média")
+                    st.line_chart(trend['avg_score'])
+                    st.subheader("Número de Avaliações")
+                    st.bar_chart(trend['num_reviews'])
+
+    if debug_mode:
+        with st.sidebar.expander("Tempos por etapa", expanded=True):
+            stages = recent_stages(session=session_id)[-DEBUG_PANEL_ROWS:][::-1]
+            st.dataframe([{column: record.get(column) for column in DEBUG_PANEL_COLUMNS} for record in stages], use_container_width=True)
+            st.caption(f"Log completo em {PROFILE_LOG_PATH}")
@@ -0,0 +1,81 @@
+"""
+Compara os backends de src.llm_integration (por padrão cuda_fp16 e cpu_int8):
+tempo de carga, memória e tokens por segundo na geração, com e sem o KV cache
+do trecho fixo do prompt. Cada backend roda num subprocesso, para que a
+memória medida seja só a dele.
+
+Uso: python -m benchmarks.bench_llm_backends --backends cuda_fp16 cpu_int8 --runs 3
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+PROMPT_PREFIX = ("User: Você é um analista de mercado editorial especialista. Sua tarefa é analisar uma coleção "
+                 "de avaliações de usuários para o livro intitulado \"{title}\". Com base nas seguintes avaliações, "
+                 "forneça um resumo conciso e acionável para um executivo da editora.\n\nAVALIAÇÕES:\n---\n")
+REVIEWS = "- great characters and a fast plot\n- the middle drags but the ending is worth it\n"
+
+def _peak_rss_mb():
+    # ru_maxrss vem em KB no Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(backend, runs, max_new_tokens, num_threads):
+    import torch
+    from src import llm_integration
+    from src.llm_integration import load_base_model_and_tokenizer, create_langchain_llm
+
+    # Sem amostragem e com tamanho fixo, para que todos os backends gerem o mesmo número de tokens.
+    llm_integration.GENERATION_SETTINGS.update(max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens, do_sample=False)
+    llm_integration.GENERATION_SETTINGS.pop("temperature", None)
+
+    start = time.perf_counter()
+    model, tokenizer = load_base_model_and_tokenizer(backend=backend, num_threads=num_threads)
+    llm = create_langchain_llm(model, tokenizer, backend=backend)
+    load_time = time.perf_counter() - start
+
+    timings = []
+    for run in range(runs):
+        prompt = PROMPT_PREFIX.format(title=f"Livro {run}") + REVIEWS + "---\n\nAssistant:"
+        start = time.perf_counter()
+        llm.invoke(prompt)
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        "backend": backend,
+        "load_s": round(load_time, 2),
+        "peak_rss_mb": round(_peak_rss_mb()),
+        "first_run_tokens_per_s": round(max_new_tokens / timings[0], 2),
+        "warm_tokens_per_s": round(max_new_tokens * (runs - 1) / sum(timings[1:]), 2) if runs > 1 else None
+    }
+    if torch.cuda.is_available():
+        result["peak_cuda_mb"] = round(torch.cuda.max_memory_allocated() / 2**20)
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['cuda_fp16', 'cpu_int8'])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--num-threads', type=int, default=None)
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.backends[0], args.runs, args.max_new_tokens, args.num_threads)))
+        sys.exit(0)
+
+    for backend in args.backends:
+        command = [sys.executable, '-m', 'benchmarks.bench_llm_backends', '--single', '--backends', backend,
+                   '--runs', str(args.runs), '--max-new-tokens', str(args.max_new_tokens)]
+        if args.num_threads:
+            command += ['--num-threads', str(args.num_threads)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend:>10} | falhou: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else completed.returncode}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{backend:>10} | carga: {result['load_s']:7.1f}s | RSS: {result['peak_rss_mb']:6d} MB | "
+              f"tokens/s (1ª): {result['first_run_tokens_per_s']:6.2f} | tokens/s (com cache): {result['warm_tokens_per_s']}")
@@ -0,0 +1,49 @@
+"""
+Mede o tempo de import dos módulos que o app.py carrega na inicialização
+(num subprocesso, com os caches de import limpos pelo próprio processo novo)
+e confere que nenhum módulo pesado de ML é importado enquanto o LLM está
+desligado. Sai com código 1 se o tempo passar do orçamento ou se algum
+módulo pesado aparecer.
+
+Uso: python -m benchmarks.bench_startup --budget 5 --runs 3
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+APP_MODULES = [
+    'streamlit', 'streamlit_lottie', 'requests',
+    'src.data_processing', 'src.filter_index', 'src.aggregates', 'src.analysis', 'src.llm_worker'
+]
+HEAVY_MODULES = ['torch', 'transformers', 'bitsandbytes', 'langchain_huggingface', 'sentence_transformers']
+
+MEASURE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{'import_s': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure_imports():
+    code = MEASURE.format(modules=APP_MODULES, heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.exit(f"falha ao importar os módulos do app: {completed.stderr.strip().splitlines()[-1]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=5.0, help='orçamento do tempo de import, em segundos')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    results = [measure_imports() for _ in range(args.runs)]
+    best = min(result['import_s'] for result in results)
+    heavy = sorted({module for result in results for module in result['heavy']})
+    print(f"import dos módulos do app: {best:.2f}s (melhor de {args.runs}) | orçamento: {args.budget:.2f}s")
+    if heavy:
+        print(f"módulos pesados importados na inicialização: {', '.join(heavy)}")
+    sys.exit(1 if best > args.budget or heavy else 0)
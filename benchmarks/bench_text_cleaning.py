@@ -0,0 +1,35 @@
+"""
+Compara a limpeza de texto linha a linha (Series.apply) com a versão
+vetorizada de src.data_processing em colunas sintéticas de avaliações.
+
+Uso: python -m benchmarks.bench_text_cleaning --rows 200000 3000000
+"""
+import argparse
+import time
+import pandas as pd
+from benchmarks.synthetic_data import make_reviews
+from src.data_processing import clean_review_text, clean_review_text_series, count_words
+
+def run(n_rows):
+    texts = make_reviews(n_rows)
+
+    start = time.perf_counter()
+    expected = texts.apply(clean_review_text)
+    expected_lengths = expected.apply(lambda x: len(x.split()))
+    baseline = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cleaned = clean_review_text_series(texts)
+    lengths = count_words(cleaned)
+    vectorized = time.perf_counter() - start
+
+    pd.testing.assert_series_equal(cleaned, expected)
+    pd.testing.assert_series_equal(lengths, expected_lengths)
+    print(f"{n_rows:>9} linhas | apply: {baseline:7.2f}s | vetorizado: {vectorized:7.2f}s | speedup: {baseline / vectorized:4.1f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[200000, 3000000])
+    args = parser.parse_args()
+    for n_rows in args.rows:
+        run(n_rows)
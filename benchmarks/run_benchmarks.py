@@ -0,0 +1,186 @@
+"""
+Cenários cronometrados sobre datasets sintéticos (benchmarks.synthetic_data)
+em várias escalas: carga e preparação dos dados (em memória, em blocos e a
+partir do cache), índices de filtro e de livros e agregados, os filtros, a
+tabela e a fatia de um livro da aba de análise de livros e a análise de um
+livro com um LLM falso. As tendências de um autor (src.trends) são
+conferidas com a contagem direta sobre o DataFrame.
+
+Os resultados são gravados em JSON (commit, ambiente e o tempo de cada
+cenário por escala); com --compare, cada cenário é comparado com um
+arquivo de resultados anterior.
+
+Uso: python -m benchmarks.run_benchmarks --scales 10000 100000 --output bench_results.json
+     python -m benchmarks.run_benchmarks --scales 10000 --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import generate_dataset
+from src.aggregates import book_summary_table, build_aggregates
+from src.analysis import EXAMPLE_SUMMARY, generate_book_analysis_langchain
+from src.data_processing import load_and_prepare_data
+from src.filter_index import book_slice, build_book_index, build_filter_index, filter_rows, sort_by_title
+from src.trends import build_trend_store, query_trend
+
+WORK_DIR = os.path.join('data', '.cache', 'bench')
+# Limiares para destacar regressões no --compare: cenários muito rápidos variam demais em termos relativos.
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_S = 0.005
+
+def _git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+@contextmanager
+def _working_dir(path):
+    # Os caminhos de src.data_processing e do cache são relativos a data/.
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def _prepare_dataset(n_reviews, seed, work_dir):
+    scale_dir = os.path.abspath(os.path.join(work_dir, f'{n_reviews}_{seed}'))
+    data_dir = os.path.join(scale_dir, 'data')
+    if not all(os.path.exists(os.path.join(data_dir, name)) for name in ['Books_rating.csv', 'books_data.csv']):
+        print(f"Gerando dataset sintético com {n_reviews} avaliações...")
+        generate_dataset(n_reviews, data_dir, seed=seed)
+    return scale_dir
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def _stub_llm():
+    from langchain_core.language_models.fake import FakeListLLM
+    return FakeListLLM(responses=[json.dumps(EXAMPLE_SUMMARY, ensure_ascii=False)])
+
+def check_trend(df, trend_store, author):
+    """
+    Compara query_trend por ano com um groupby direto nas avaliações do
+    autor (cada avaliação conta uma vez, mesmo com o nome repetido na lista
+    de autores). Levanta AssertionError se divergirem.
+    """
+    rows = df[df['review_time'].notna() & df['authors'].map(lambda authors: author in authors)]
+    expected = rows.groupby(rows['review_time'].dt.year.astype(str))['score'].agg(['count', 'mean', 'std'])
+    trend = query_trend(trend_store, 'author', author, period='year').reindex(expected.index)
+    if not (np.array_equal(trend['num_reviews'].to_numpy(), expected['count'].to_numpy())
+            and np.allclose(trend['avg_score'], expected['mean'])
+            and np.allclose(trend['score_std'], expected['std'], equal_nan=True)):
+        raise AssertionError(f"Tendência de {author!r} diverge da contagem direta:\n{trend}\n{expected}")
+
+def run_scale(n_reviews, repeat, seed=0, work_dir=WORK_DIR):
+    """Roda todos os cenários numa escala; retorna uma lista de resultados."""
+    scale_dir = _prepare_dataset(n_reviews, seed, work_dir)
+    results = []
+
+    def record(scenario, func, rows=None, repeat=repeat):
+        result, timings = _time(func, repeat)
+        results.append({
+            'scenario': scenario,
+            'scale': n_reviews,
+            'rows': rows(result) if rows else None,
+            'median_s': float(np.median(timings)),
+            'min_s': min(timings),
+            'runs_s': timings
+        })
+        print(f"{n_reviews:>9} | {scenario:<30} | mediana: {np.median(timings):8.3f}s | mín: {min(timings):8.3f}s")
+        return result
+
+    with _working_dir(scale_dir):
+        df = record('load_and_prepare_data', lambda: load_and_prepare_data(use_sample=False, use_cache=False), len)
+        record('load_and_prepare_data_chunked',
+               lambda: load_and_prepare_data(use_sample=False, chunksize=max(n_reviews // 4, 1000), use_cache=False), len)
+        load_and_prepare_data(use_sample=False, use_cache=True)
+        record('load_and_prepare_data_cached', lambda: load_and_prepare_data(use_sample=False, use_cache=True), len)
+
+        record('build_aggregates', lambda: build_aggregates(df), lambda aggregates: len(aggregates['books']))
+        df = record('sort_by_title', lambda: sort_by_title(df), len)
+        filter_index = record('build_filter_index', lambda: build_filter_index(df))
+        book_index = record('build_book_index', lambda: build_book_index(df), lambda index: len(index['labels']))
+
+        author = df['authors'].explode().value_counts().index[0]
+        trend_store = build_trend_store(df, use_sample=False)
+        record('query_trend_author', lambda: query_trend(trend_store, 'author', author, period='year'), len)
+        # Confere também um autor repetido dentro da lista de alguma avaliação, se houver.
+        repeated = df['authors'].map(lambda authors: len(authors) != len(set(authors)))
+        for checked_author in {author, *df.loc[repeated, 'authors'].explode().value_counts().index[:1]}:
+            check_trend(df, trend_store, checked_author)
+        category = df['categories'].explode().value_counts().index[0]
+        author_rows = record('filter_author', lambda: filter_rows(filter_index, author=author), len)
+        category_rows = record('filter_category', lambda: filter_rows(filter_index, category=category), len)
+        record('book_summary_table_author', lambda: book_summary_table(df, book_index, author_rows), len)
+        record('book_summary_table_category', lambda: book_summary_table(df, book_index, category_rows), len)
+
+        title = df['Title'].value_counts().index[0]
+        book_df = record('book_slice', lambda: book_slice(df, book_index, title), len)
+        llm = _stub_llm()
+        record('book_analysis_stub_llm', lambda: generate_book_analysis_langchain(book_df, title, llm, use_cache=False),
+               lambda _: len(book_df))
+    return results
+
+def compare(results, baseline_path):
+    """Razão entre o tempo mediano atual e o do arquivo de resultados anterior, por cenário e escala."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['scenario'], r['scale']): r for r in json.load(f)['results']}
+    print(f"\nComparação com {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result['scenario'], result['scale']))
+        if previous is None:
+            continue
+        ratio = result['median_s'] / previous['median_s'] if previous['median_s'] else float('inf')
+        regressed = ratio > REGRESSION_RATIO and result['median_s'] - previous['median_s'] > REGRESSION_MIN_S
+        flag = '  <-- regressão' if regressed else ''
+        print(f"{result['scale']:>9} | {result['scenario']:<30} | {previous['median_s']:8.3f}s -> {result['median_s']:8.3f}s ({ratio:4.2f}x){flag}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=WORK_DIR, help='onde os datasets sintéticos e os caches são gravados')
+    parser.add_argument('--output', default=None, help='arquivo JSON para os resultados')
+    parser.add_argument('--compare', default=None, help='arquivo JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    results = [result for n_reviews in args.scales for result in run_scale(n_reviews, args.repeat, args.seed, args.work_dir)]
+    commit, dirty = _git_commit()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        # ru_maxrss vem em KB no Linux.
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados gravados em {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    if not args.output and not args.compare:
+        json.dump(report, sys.stdout, indent=2)
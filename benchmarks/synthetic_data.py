@@ -0,0 +1,153 @@
+"""
+Gera Books_rating.csv e books_data.csv sintéticos, no mesmo esquema que
+src.data_processing lê, em qualquer escala: popularidade dos livros com
+cauda longa, autores e categorias como strings de listas do Python (com
+listas vazias, malformadas e ausentes), HTML e entidades no texto,
+avaliações duplicadas e linhas sem título ou usuário.
+
+Uso: python -m benchmarks.synthetic_data --reviews 100000 --output-dir /tmp/bench/data
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# A maioria das avaliações reais é texto simples; entidades HTML e tags aparecem em poucas.
+REVIEW_FRAGMENTS = [
+    "I couldn't put it down, the characters felt real and the plot kept me guessing.",
+    "Solid read. The author knows the subject well, though some chapters repeat.",
+    "Bought it for a class in 2004 and still recommend it to friends!",
+    "Too long for what it says; the last hundred pages could be cut.",
+    "This book was <b>amazing</b>, I couldn't put it down!",
+    "Not worth the price &amp; the ending was rushed...",
+    "A classic.&nbsp;Read it twice in 2004 &lt;3",
+    "Meh. 2/5 stars<br/>The middle drags.",
+    "Café, naïve façade — unicode spaces and\ttabs",
+    "Great gift for my son!!! <a href=\"x\">link</a>",
+    "",
+]
+TITLE_WORDS = ["Shadow", "River", "Garden", "War", "Kitchen", "Night", "Empire", "Letters", "Mountain", "Code",
+               "Silence", "Harvest", "Island", "Memory", "Storm", "Journey"]
+FIRST_NAMES = ["Mary", "John", "Ana", "Robert", "Clarice", "James", "Jane", "Jorge", "Toni", "Ernest", "Agatha", "Paulo"]
+LAST_NAMES = ["Smith", "Lispector", "Austen", "Amado", "Morrison", "Hemingway", "Christie", "Coelho", "O'Brien", "Tolkien"]
+CATEGORIES = ["Fiction", "History", "Religion", "Juvenile Fiction", "Biography & Autobiography", "Business & Economics",
+              "Computers", "Cooking", "Health & Fitness", "Poetry", "Science", "Travel", "Self-Help", "Art", "Philosophy"]
+# Distribuição das notas no dataset real: fortemente concentrada em 5.
+SCORE_PROBABILITIES = [0.06, 0.05, 0.08, 0.2, 0.61]
+FIRST_REVIEW_TIME = 820454400   # 1996-01-01
+LAST_REVIEW_TIME = 1362096000   # 2013-03-01
+
+def make_reviews(n_rows, seed=0):
+    """Textos de avaliação no formato de full_review_text: resumo + '. ' + texto."""
+    summaries, bodies = make_review_parts(n_rows, seed)
+    return summaries + '. ' + bodies
+
+def make_review_parts(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    fragments = np.array(REVIEW_FRAGMENTS, dtype=object)
+    picks = rng.integers(0, len(REVIEW_FRAGMENTS), size=(n_rows, 4))
+    summaries = pd.Series(fragments[picks[:, 0]])
+    bodies = pd.Series(fragments[picks[:, 1]]) + ' ' + pd.Series(fragments[picks[:, 2]]) + ' ' + pd.Series(fragments[picks[:, 3]])
+    return summaries, bodies
+
+def _list_strings(rng, labels, n_rows, max_items):
+    # Mesma representação do CSV original: repr de uma lista do Python.
+    sizes = rng.integers(1, max_items + 1, size=n_rows)
+    picks = rng.integers(0, len(labels), size=sizes.sum())
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    return np.array([repr([labels[i] for i in picks[start:stop]]) for start, stop in zip(bounds[:-1], bounds[1:])], dtype=object)
+
+def _replace_some(rng, values, share, replacement):
+    values[rng.random(len(values)) < share] = replacement
+    return values
+
+def make_metadata(n_books, seed=0):
+    """Metadados dos livros no esquema de books_data.csv."""
+    rng = np.random.default_rng(seed)
+    words = rng.integers(0, len(TITLE_WORDS), size=(n_books, 2))
+    titles = [f"The {TITLE_WORDS[a]} of {TITLE_WORDS[b]}, Vol. {i}" for i, (a, b) in enumerate(words)]
+
+    n_authors = max(n_books // 3, 1)
+    names = rng.integers(0, [len(FIRST_NAMES), len(LAST_NAMES)], size=(n_authors, 2))
+    author_names = [f"{FIRST_NAMES[a]} {LAST_NAMES[b]} {i}" for i, (a, b) in enumerate(names)]
+
+    authors = _list_strings(rng, author_names, n_books, max_items=3)
+    authors = _replace_some(rng, authors, 0.03, np.nan)
+    authors = _replace_some(rng, authors, 0.02, "[]")
+    authors = _replace_some(rng, authors, 0.01, "['Unclosed")
+    categories = _list_strings(rng, CATEGORIES, n_books, max_items=1)
+    categories = _replace_some(rng, categories, 0.2, np.nan)
+
+    publishers = np.array([f"Publisher {i}" for i in rng.integers(0, max(n_books // 50, 1), size=n_books)], dtype=object)
+    return pd.DataFrame({
+        'Title': titles,
+        'description': _replace_some(rng, np.array([f"Description of book {i}." for i in range(n_books)], dtype=object), 0.3, np.nan),
+        'authors': authors,
+        'image': np.nan,
+        'previewLink': [f"http://books.example.com/preview?id={i}" for i in range(n_books)],
+        'publisher': _replace_some(rng, publishers, 0.3, np.nan),
+        'publishedDate': rng.integers(1900, 2013, size=n_books).astype(str),
+        'infoLink': [f"http://books.example.com/info?id={i}" for i in range(n_books)],
+        'categories': categories,
+        'ratingsCount': _replace_some(rng, rng.integers(1, 5000, size=n_books).astype(float), 0.5, np.nan)
+    })
+
+def make_ratings(n_reviews, titles, seed=0):
+    """Avaliações no esquema de Books_rating.csv, com popularidade de cauda longa entre os títulos."""
+    rng = np.random.default_rng(seed + 1)
+    n_unique = n_reviews - n_reviews // 100
+    popularity = 1 / np.arange(1, len(titles) + 1) ** 1.1
+    book_ids = rng.choice(len(titles), size=n_unique, p=popularity / popularity.sum())
+    # Alguns títulos avaliados não existem nos metadados.
+    missing_meta = rng.random(n_unique) < 0.02
+    title_values = np.array(titles, dtype=object)[book_ids]
+    title_values[missing_meta] = [f"Unlisted Book {i}" for i in book_ids[missing_meta]]
+
+    n_users = max(n_reviews // 4, 1)
+    user_ids = rng.integers(0, n_users, size=n_unique)
+    helpful_total = rng.integers(0, 30, size=n_unique)
+    helpful_yes = (helpful_total * rng.random(n_unique)).astype(int)
+    summaries, texts = make_review_parts(n_unique, seed)
+
+    ratings = pd.DataFrame({
+        'Id': [f"B{i:09d}" for i in book_ids],
+        'Title': _replace_some(rng, title_values, 0.001, np.nan),
+        'Price': _replace_some(rng, np.round(rng.uniform(5, 60, size=n_unique), 2), 0.8, np.nan),
+        'User_id': _replace_some(rng, np.array([f"A{u:013X}" for u in user_ids], dtype=object), 0.01, np.nan),
+        'profileName': [f"reader_{u}" for u in user_ids],
+        'review/helpfulness': [f"{yes}/{total}" for yes, total in zip(helpful_yes, helpful_total)],
+        'score': rng.choice(np.arange(1.0, 6.0), size=n_unique, p=SCORE_PROBABILITIES),
+        'time': rng.integers(FIRST_REVIEW_TIME, LAST_REVIEW_TIME, size=n_unique),
+        'summary': _replace_some(rng, summaries.to_numpy(), 0.01, np.nan),
+        'text': _replace_some(rng, texts.to_numpy(), 0.001, np.nan)
+    })
+    # Cerca de 1% de avaliações repetidas, espalhadas pelo arquivo.
+    duplicates = ratings.sample(n=n_reviews - n_unique, random_state=seed, replace=True)
+    return pd.concat([ratings, duplicates]).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def generate_dataset(n_reviews, output_dir='data', n_books=None, seed=0):
+    """
+    Grava Books_rating.csv (`n_reviews` linhas) e books_data.csv em
+    `output_dir`. Por padrão há um livro para cada 20 avaliações. Retorna os
+    caminhos dos dois arquivos.
+    """
+    n_books = n_books or max(n_reviews // 20, 50)
+    os.makedirs(output_dir, exist_ok=True)
+    metadata = make_metadata(n_books, seed)
+    ratings = make_ratings(n_reviews, metadata['Title'].tolist(), seed)
+
+    ratings_path = os.path.join(output_dir, 'Books_rating.csv')
+    metadata_path = os.path.join(output_dir, 'books_data.csv')
+    ratings.to_csv(ratings_path, index=False)
+    metadata.to_csv(metadata_path, index=False)
+    return ratings_path, metadata_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=None)
+    parser.add_argument('--output-dir', default='data')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in generate_dataset(args.reviews, args.output_dir, args.books, args.seed):
+        print(f"{path}: {os.path.getsize(path) / 2**20:.1f} MB")
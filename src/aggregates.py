@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from src.profiling import profiled
+
+TOP_USERS = 20
+TOP_BOOKS_PER_GENRE = 10
+
+def _join_labels(labels):
+    return ', '.join(sorted(set(map(str, labels))))
+
+def _sorted_desc(series):
+    # Ordenação estável: empates ficam na ordem alfabética do índice agrupado.
+    return series.sort_values(ascending=False, kind='stable')
+
+def build_book_table(df):
+    """Uma linha por título, com autores e estatísticas de nota."""
+    first_rows = df.drop_duplicates(subset=['Title'])[['Title', 'authors']].set_index('Title')
+    books = df.groupby('Title').agg(
+        num_reviews=('Id', 'count'),
+        score_count=('score', 'count'),
+        score_sum=('score', 'sum'),
+        avg_score=('score', 'mean'),
+        score_std=('score', 'std')
+    )
+    books['authors'] = first_rows['authors'].reindex(books.index)
+    books['authors_str'] = books['authors'].map(_join_labels)
+    return books
+
+def build_author_table(books):
+    """Uma linha por autor, agregando os livros da tabela por título."""
+    exploded = books[['authors', 'num_reviews', 'score_count', 'score_sum']].explode('authors')
+    authors = exploded.groupby('authors').agg(
+        num_books=('num_reviews', 'size'),
+        num_reviews=('num_reviews', 'sum'),
+        score_count=('score_count', 'sum'),
+        score_sum=('score_sum', 'sum')
+    )
+    authors['avg_score'] = authors['score_sum'] / authors['score_count']
+    return authors
+
+def build_genre_tables(df, books):
+    """
+    Tabelas da aba de gêneros: resumo por gênero, rankings já ordenados e os
+    livros mais avaliados de cada gênero (um único DataFrame ordenado por
+    gênero, fatiado por `top_books_slices`).
+    """
+    exploded = df[['categories', 'Title', 'score', 'Id']].explode('categories')
+
+    genres = exploded.groupby('categories').agg(
+        num_rows=('Title', 'size'),
+        num_reviews=('Id', 'count'),
+        avg_score=('score', 'mean'),
+        num_books=('Title', 'nunique')
+    )
+
+    book_genres = exploded[['categories', 'Title']].drop_duplicates()
+    genre_authors = book_genres.join(books['authors'], on='Title').explode('authors')
+    genres['num_authors'] = genre_authors.groupby('categories')['authors'].nunique().reindex(genres.index, fill_value=0)
+
+    book_stats = exploded.groupby(['categories', 'Title']).agg(
+        Nota_Média=('score', 'mean'),
+        N_Avaliações=('Id', 'count')
+    ).reset_index()
+    book_stats['Autores'] = book_stats['Title'].map(books['authors_str'])
+    book_stats = book_stats.sort_values(['categories', 'N_Avaliações'], ascending=[True, False], kind='stable')
+    top_books = book_stats.groupby('categories', sort=False).head(TOP_BOOKS_PER_GENRE).reset_index(drop=True)
+
+    labels, starts = np.unique(top_books['categories'].to_numpy(), return_index=True)
+    stops = np.append(starts[1:], len(top_books))
+    top_books_slices = {label: slice(start, stop) for label, start, stop in zip(labels, starts, stops)}
+
+    return {
+        'genres': genres,
+        'overview': {
+            'unique_genres': len(genres),
+            'avg_rows_per_genre': genres['num_rows'].mean(),
+            'avg_score_per_genre': genres['avg_score'].mean()
+        },
+        'rankings': {
+            'num_rows': _sorted_desc(genres['num_rows']),
+            'avg_score': _sorted_desc(genres['avg_score']),
+            'num_reviews': _sorted_desc(genres['num_reviews'])
+        },
+        'top_books': top_books[['Title', 'Autores', 'Nota_Média', 'N_Avaliações']],
+        'top_books_slices': top_books_slices
+    }
+
+def build_user_tables(df):
+    """Uma linha por usuário e os rankings de Top N da aba de usuários."""
+    users = df.drop_duplicates(subset=['User_id'])[['User_id', 'profileName', 'user_review_count', 'user_avg_score']]
+    return {
+        'users': users,
+        'rankings': {
+            'most_reviews': users.nlargest(TOP_USERS, 'user_review_count'),
+            'best_avg_score': users.nlargest(TOP_USERS, 'user_avg_score'),
+            'worst_avg_score': users.nsmallest(TOP_USERS, 'user_avg_score')
+        }
+    }
+
+@profiled()
+def build_aggregates(df):
+    """
+    Materializa, uma vez no carregamento, as tabelas de resumo por livro,
+    autor, gênero e usuário usadas pelas abas do dashboard, para que cada
+    interação seja só uma consulta a essas tabelas.
+    """
+    books = build_book_table(df)
+    return {
+        'books': books,
+        'authors': build_author_table(books),
+        'genres': build_genre_tables(df, books),
+        'users': build_user_tables(df)
+    }
+
+def genre_top_books(aggregates, genre):
+    """Livros mais avaliados do gênero, já ordenados."""
+    genre_tables = aggregates['genres']
+    rows = genre_tables['top_books_slices'].get(genre, slice(0, 0))
+    return genre_tables['top_books'].iloc[rows].reset_index(drop=True)
+
+def book_summary_table(df, book_index, rows):
+    """
+    Tabela da aba de análise de livros: uma linha por título e autores entre
+    as linhas `rows` de `df` (ordenado por título, ver build_book_index), com
+    categorias, nota média e número de avaliações, ordenada pelo número de
+    avaliações. Só as linhas selecionadas são lidas e os textos de exibição
+    vêm prontos do índice, então o custo depende do tamanho do resultado.
+    """
+    group_ids, inverse = np.unique(book_index['row_groups'][rows], return_inverse=True)
+    scores = df['score'].iloc[rows].to_numpy(dtype=float)
+    has_score = ~np.isnan(scores)
+    has_id = df['Id'].iloc[rows].notna().to_numpy()
+
+    table = book_index['groups'].iloc[group_ids].reset_index(drop=True)
+    table['score_count'] = np.bincount(inverse, weights=has_score, minlength=len(group_ids))
+    table['score_sum'] = np.bincount(inverse, weights=np.where(has_score, scores, 0), minlength=len(group_ids))
+    table['num_reviews'] = np.bincount(inverse, weights=has_id, minlength=len(group_ids)).astype(np.int64)
+
+    if table.duplicated(subset=['Title', 'authors_str']).any():
+        # Mesmo título e autores com categorias diferentes (títulos repetidos nos metadados).
+        table = table.groupby(['Title', 'authors_str'], sort=False).agg(
+            categories_str=('categories_str', lambda s: ', '.join(s.unique())),
+            score_count=('score_count', 'sum'),
+            score_sum=('score_sum', 'sum'),
+            num_reviews=('num_reviews', 'sum')
+        ).reset_index()
+
+    table = pd.DataFrame({
+        'Title': table['Title'],
+        'authors_str': table['authors_str'],
+        'categories': table['categories_str'],
+        'avg_score': table['score_sum'] / table['score_count'],
+        'num_reviews': table['num_reviews']
+    }).sort_values(['Title', 'authors_str'], kind='stable', ignore_index=True)
+    return table.sort_values(by='num_reviews', ascending=False, kind='stable')
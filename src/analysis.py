@@ -1,28 +1,12 @@
+import time
 import pandas as pd
-from langchain.prompts import PromptTemplate
-from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+from functools import lru_cache
+from src.retrieval import select_reviews_for_question
+from src.review_sampling import SUMMARY_TOKEN_BUDGET, select_representative_reviews, token_counter_for
+from src.llm_cache import llm_cache_key, load_cached_response, save_cached_response
+from src.profiling import profiled, profiling_enabled, stage
 
-def generate_book_analysis_langchain(book_df: pd.DataFrame, book_title: str, llm):
-    if book_df.empty:
-        return {"avg_score": 0, "num_reviews": 0, "avg_review_length": 0, 
-                "score_distribution": pd.Series(dtype='int64'), "score_std_dev": 0, 
-                "avg_reviewer_experience": 0, "llm_summary": None}
-    
-    avg_score = book_df['score'].mean()
-    num_reviews = len(book_df)
-    avg_review_length = book_df['review_length'].mean()
-    score_std_dev = book_df['score'].std()
-    avg_reviewer_experience = book_df['user_review_count'].mean()
-
-    response_schemas = [
-        ResponseSchema(name="destaques_positivos", description="Uma lista em bullet points dos principais elogios."),
-        ResponseSchema(name="criticas_construtivas", description="Uma lista em bullet points das principais críticas."),
-        ResponseSchema(name="insight_acionavel", description="Uma sugestão de ação concreta para a editora.")
-    ]
-    output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
-    format_instructions = output_parser.get_format_instructions()
-
-    template = """User: Você é um analista de mercado editorial especialista. Sua tarefa é analisar uma coleção de avaliações de usuários para o livro intitulado "{book_title}". Com base nas seguintes avaliações, forneça um resumo conciso e acionável para um executivo da editora.
+SUMMARY_TEMPLATE = """User: Você é um analista de mercado editorial especialista. Sua tarefa é analisar uma coleção de avaliações de usuários para o livro intitulado "{book_title}". Com base nas seguintes avaliações, forneça um resumo conciso e acionável para um executivo da editora.
 
     AVALIAÇÕES:
     ---
@@ -33,34 +17,118 @@ def generate_book_analysis_langchain(book_df: pd.DataFrame, book_title: str, llm
     {format_instructions}
 
     Assistant:"""
+FOLLOW_UP_MAX_REVIEWS = 50
+# Contexto de 4k do Phi-3 menos os 512 tokens gerados e o restante do prompt.
+FOLLOW_UP_TOKEN_BUDGET = 2500
+
+# Retorna esse exemplo em (llm=None)
+EXAMPLE_SUMMARY = {
+    "destaques_positivos": "- O enredo é acelerado e envolvente.\n- Os personagens são bem desenvolvidos.",
+    "criticas_construtivas": "- O meio do livro tem um ritmo mais lento.",
+    "insight_acionavel": "Focar o marketing no ritmo da trama para atrair leitores."
+}
+ERROR_SUMMARY = {
+    "destaques_positivos": "Erro ao gerar análise.",
+    "criticas_construtivas": "O modelo pode não ter respondido no formato esperado.",
+    "insight_acionavel": "Verifique os logs para mais detalhes."
+}
 
+@lru_cache(maxsize=None)
+def _summary_prompt_and_parser():
+    """Schemas, parser e template do resumo, montados uma única vez por processo."""
+    # Import tardio: o LangChain só é carregado quando o LLM é usado de fato.
+    from langchain.prompts import PromptTemplate
+    from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+    response_schemas = [
+        ResponseSchema(name="destaques_positivos", description="Uma lista em bullet points dos principais elogios."),
+        ResponseSchema(name="criticas_construtivas", description="Uma lista em bullet points das principais críticas."),
+        ResponseSchema(name="insight_acionavel", description="Uma sugestão de ação concreta para a editora.")
+    ]
+    output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
     prompt_template = PromptTemplate(
-        template=template,
+        template=SUMMARY_TEMPLATE,
         input_variables=["book_title", "reviews_text"],
-        partial_variables={"format_instructions": format_instructions}
+        partial_variables={"format_instructions": output_parser.get_format_instructions()}
     )
+    return prompt_template, output_parser
+
+def _stream_text(chain, input_data, on_token, label):
+    """
+    Gera o texto com `chain.stream`, chamando on_token(texto_parcial) a cada
+    pedaço recebido, e registra o tempo até o primeiro token separado do
+    tempo total de geração.
+    """
+    start = time.perf_counter()
+    time_to_first_token = None
+    text = ""
+    for chunk in chain.stream(input_data):
+        if time_to_first_token is None:
+            time_to_first_token = time.perf_counter() - start
+        text += chunk
+        on_token(text)
+    total_time = time.perf_counter() - start
+    print(f"[{label}] primeiro token em {time_to_first_token if time_to_first_token is not None else total_time:.2f}s, geração total em {total_time:.2f}s")
+    return text
+
+def _generate_text(chain, input_data, on_token, label, count_tokens):
+    """
+    Texto gerado pela chain (transmitido com on_token, se houver), numa etapa
+    de instrumentação com as contagens de tokens do prompt e da resposta.
+    """
+    with stage('llm_generate') as record:
+        text = _stream_text(chain, input_data, on_token, label) if on_token else chain.invoke(input_data)
+        if profiling_enabled():
+            record['prompt_tokens'] = count_tokens(chain.first.format(**input_data))
+            record['generated_tokens'] = count_tokens(text)
+    return text
 
-    reviews_to_analyze = "\n".join("- " + review for review in book_df['cleaned_review_text'].head(20))
-    input_data = {"book_title": book_title, "reviews_text": reviews_to_analyze}
+def _empty_analysis():
+    return {"avg_score": 0, "num_reviews": 0, "avg_review_length": 0, 
+            "score_distribution": pd.Series(dtype='int64'), "score_std_dev": 0, 
+            "avg_reviewer_experience": 0, "llm_summary": None}
+
+def _format_reviews(reviews):
+    return "\n".join("- " + review for review in reviews)
+
+@profiled(name='book_analysis', rows=lambda result: result['num_reviews'])
+def generate_book_analysis_langchain(book_df: pd.DataFrame, book_title: str, llm, use_cache=True, token_budget=SUMMARY_TOKEN_BUDGET,
+                                     on_token=None):
+    """
+    Estatísticas do livro e resumo estruturado do LLM. Com `on_token`, a saída
+    do modelo é transmitida token a token (on_token recebe o texto parcial) e
+    só é convertida para o dicionário do resumo ao final.
+    """
+    if book_df.empty:
+        return _empty_analysis()
+    
+    avg_score = book_df['score'].mean()
+    num_reviews = len(book_df)
+    avg_review_length = book_df['review_length'].mean()
+    score_std_dev = book_df['score'].std()
+    avg_reviewer_experience = book_df['user_review_count'].mean()
 
-    # Retorna esse exemplo em (llm=None)
     if not llm:
-        llm_summary_dict = {
-            "destaques_positivos": "- O enredo é acelerado e envolvente.\n- Os personagens são bem desenvolvidos.",
-            "criticas_construtivas": "- O meio do livro tem um ritmo mais lento.",
-            "insight_acionavel": "Focar o marketing no ritmo da trama para atrair leitores."
-        }
+        llm_summary_dict = dict(EXAMPLE_SUMMARY)
     else:
+        prompt_template, output_parser = _summary_prompt_and_parser()
+        count_tokens = token_counter_for(llm)
+
+        # Amostra estratificada por nota e sem duplicatas, no lugar das primeiras avaliações do arquivo.
+        with stage('select_reviews', rows=num_reviews):
+            reviews_to_analyze = _format_reviews(select_representative_reviews(book_df, token_budget, count_tokens=count_tokens))
+        input_data = {"book_title": book_title, "reviews_text": reviews_to_analyze}
+
+        cache_key = llm_cache_key(llm, prompt_template.format(**input_data)) if use_cache else None
+        llm_summary_dict = load_cached_response(cache_key) if cache_key else None
+
+    if llm and llm_summary_dict is None:
         try:
-            chain = prompt_template | llm | output_parser
-            llm_summary_dict = chain.invoke(input_data)
+            llm_summary_dict = output_parser.parse(_generate_text(prompt_template | llm, input_data, on_token, "resumo", count_tokens))
+            if cache_key:
+                save_cached_response(cache_key, llm_summary_dict)
         except Exception as e:
             print(f"Erro ao invocar a chain do LangChain: {e}")
-            llm_summary_dict = {
-                "destaques_positivos": "Erro ao gerar análise.",
-                "criticas_construtivas": "O modelo pode não ter respondido no formato esperado.",
-                "insight_acionavel": "Verifique os logs para mais detalhes."
-            }
+            llm_summary_dict = dict(ERROR_SUMMARY)
     
     return {
         "avg_score": avg_score, 
@@ -71,13 +139,65 @@ def generate_book_analysis_langchain(book_df: pd.DataFrame, book_title: str, llm
         "llm_summary": llm_summary_dict
     }
 
-def generate_follow_up_answer(book_df: pd.DataFrame, book_title: str, question: str, llm):
-    if not llm or book_df.empty or not question:
-        return "Por favor, selecione um livro e faça uma pergunta."
+def generate_book_analyses_batch(df: pd.DataFrame, book_titles, llm, batch_size=8, use_cache=True, token_budget=SUMMARY_TOKEN_BUDGET):
+    """
+    Versão em lote de generate_book_analysis_langchain para vários títulos:
+    as estatísticas de todos os livros saem de um único groupby, o prompt e
+    o parser são montados uma vez, e os prompts passam pela chain com
+    `chain.batch` em grupos de `batch_size` (o pipeline do HuggingFace faz o
+    padding dentro de cada grupo). Títulos com resumo no cache de respostas
+    não passam pelo LLM. Retorna {título: resultado}, no mesmo
+    formato da versão individual.
+    """
+    book_titles = list(dict.fromkeys(book_titles))
+    books_df = df[df['Title'].isin(book_titles)]
+
+    stats = books_df.groupby('Title').agg(
+        avg_score=('score', 'mean'),
+        num_reviews=('score', 'size'),
+        avg_review_length=('review_length', 'mean'),
+        score_std_dev=('score', 'std'),
+        avg_reviewer_experience=('user_review_count', 'mean')
+    )
+    count_tokens = token_counter_for(llm)
+    reviews_text = {
+        title: _format_reviews(select_representative_reviews(book_df, token_budget, count_tokens=count_tokens))
+        for title, book_df in books_df.groupby('Title')
+    } if llm else {}
+
+    found_titles = [title for title in book_titles if title in stats.index]
+    if not llm:
+        summaries = {title: dict(EXAMPLE_SUMMARY) for title in found_titles}
+    else:
+        prompt_template, output_parser = _summary_prompt_and_parser()
+        chain = prompt_template | llm | output_parser
+        inputs = {title: {"book_title": title, "reviews_text": reviews_text[title]} for title in found_titles}
+        cache_keys = {title: llm_cache_key(llm, prompt_template.format(**inputs[title])) for title in found_titles} if use_cache else {}
+
+        summaries = {}
+        for title, key in cache_keys.items():
+            cached = load_cached_response(key)
+            if cached is not None:
+                summaries[title] = cached
+        pending = [title for title in found_titles if title not in summaries]
+
+        for start in range(0, len(pending), batch_size):
+            batch_titles = pending[start:start + batch_size]
+            batch = chain.batch([inputs[title] for title in batch_titles], return_exceptions=True)
+            for title, summary in zip(batch_titles, batch):
+                if isinstance(summary, Exception):
+                    print(f"Erro ao invocar a chain do LangChain para '{title}': {summary}")
+                    summary = dict(ERROR_SUMMARY)
+                elif use_cache:
+                    save_cached_response(cache_keys[title], summary)
+                summaries[title] = summary
 
-    reviews_context = "\n".join("- " + review for review in book_df['cleaned_review_text'].head(50))
+    results = {title: _empty_analysis() for title in book_titles}
+    for title in found_titles:
+        results[title] = {**stats.loc[title].to_dict(), "num_reviews": int(stats.at[title, 'num_reviews']), "llm_summary": summaries[title]}
+    return results
 
-    follow_up_template = """User: Você é um assistente de análise de dados. Sua tarefa é responder à **Pergunta do Usuário** sobre o livro **"{book_title}"**, baseando-se estritamente no **Contexto das Avaliações** fornecido. Seja direto e limite sua resposta a no máximo 60 palavras.
+FOLLOW_UP_TEMPLATE = """User: Você é um assistente de análise de dados. Sua tarefa é responder à **Pergunta do Usuário** sobre o livro **"{book_title}"**, baseando-se estritamente no **Contexto das Avaliações** fornecido. Seja direto e limite sua resposta a no máximo 60 palavras.
 
     **Contexto das Avaliações:**
     ---
@@ -87,17 +207,80 @@ def generate_follow_up_answer(book_df: pd.DataFrame, book_title: str, question:
     **Pergunta do Usuário:** {user_question}
 
     Assistant:"""
+NO_QUESTION_ANSWER = "Por favor, selecione um livro e faça uma pergunta."
+ERROR_ANSWER = "Ocorreu um erro ao processar sua pergunta."
 
-    prompt = PromptTemplate.from_template(follow_up_template)
+@lru_cache(maxsize=None)
+def _follow_up_prompt():
+    from langchain.prompts import PromptTemplate
+    return PromptTemplate.from_template(FOLLOW_UP_TEMPLATE)
+
+def _follow_up_input(book_df, book_title, question, llm):
+    # Só as avaliações mais relevantes para a pergunta, dentro do orçamento de tokens do prompt.
+    with stage('select_reviews', rows=len(book_df)):
+        reviews_context = _format_reviews(select_reviews_for_question(
+            book_df['cleaned_review_text'], question, top_k=FOLLOW_UP_MAX_REVIEWS, token_budget=FOLLOW_UP_TOKEN_BUDGET,
+            count_tokens=token_counter_for(llm)
+        ))
+    return {
+        "book_title": book_title, # Passa o título para o prompt
+        "reviews_context": reviews_context,
+        "user_question": question
+    }
+
+@profiled(name='follow_up')
+def generate_follow_up_answer(book_df: pd.DataFrame, book_title: str, question: str, llm, use_cache=True, on_token=None):
+    """
+    Resposta curta a uma pergunta sobre o livro. Com `on_token`, a resposta é
+    transmitida token a token (on_token recebe o texto parcial).
+    """
+    if not llm or book_df.empty or not question:
+        return NO_QUESTION_ANSWER
+
+    prompt = _follow_up_prompt()
     chain = prompt | llm 
+    input_data = _follow_up_input(book_df, book_title, question, llm)
+
+    cache_key = llm_cache_key(llm, prompt.format(**input_data)) if use_cache else None
+    cached = load_cached_response(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
 
     try:
-        response = chain.invoke({
-            "book_title": book_title, # Passa o título para o prompt
-            "reviews_context": reviews_context,
-            "user_question": question
-        })
+        response = _generate_text(chain, input_data, on_token, "pergunta", token_counter_for(llm))
+        if cache_key:
+            save_cached_response(cache_key, response)
         return response
     except Exception as e:
         print(f"Erro na pergunta de acompanhamento: {e}")
-        return "Ocorreu um erro ao processar sua pergunta."
\ No newline at end of file
+        return ERROR_ANSWER
+
+def generate_follow_up_answers_batch(requests, llm, use_cache=True):
+    """
+    Versão em lote de generate_follow_up_answer: `requests` é uma lista de
+    (book_df, book_title, question) e as perguntas sem resposta no cache são
+    geradas juntas com `chain.batch`. Retorna as respostas na mesma ordem.
+    """
+    answers = [None] * len(requests)
+    pending = []
+    prompt = _follow_up_prompt() if llm else None
+    for i, (book_df, book_title, question) in enumerate(requests):
+        if not llm or book_df.empty or not question:
+            answers[i] = NO_QUESTION_ANSWER
+            continue
+        input_data = _follow_up_input(book_df, book_title, question, llm)
+        cache_key = llm_cache_key(llm, prompt.format(**input_data)) if use_cache else None
+        answers[i] = load_cached_response(cache_key) if cache_key else None
+        if answers[i] is None:
+            pending.append((i, input_data, cache_key))
+
+    if pending:
+        responses = (prompt | llm).batch([input_data for _, input_data, _ in pending], return_exceptions=True)
+        for (i, _, cache_key), response in zip(pending, responses):
+            if isinstance(response, Exception):
+                print(f"Erro na pergunta de acompanhamento: {response}")
+                response = ERROR_ANSWER
+            elif cache_key:
+                save_cached_response(cache_key, response)
+            answers[i] = response
+    return answers
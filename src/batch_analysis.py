@@ -0,0 +1,77 @@
+"""
+Gera em lote as análises de IA de vários livros (por exemplo, todos os
+títulos de uma categoria ou de um autor) e grava os resultados em JSON Lines.
+
+Uso: python -m src.batch_analysis --category Fiction --output data/analises.jsonl
+     python -m src.batch_analysis --author "J. R. R. Tolkien" --no-llm
+"""
+import argparse
+import json
+import time
+import numpy as np
+from src.data_processing import load_and_prepare_data
+from src.filter_index import build_filter_index, filter_rows
+from src.analysis import generate_book_analyses_batch
+
+def select_titles(df, filter_index, author=None, category=None, titles=None):
+    """Títulos explicitamente informados e/ou todos os livros do autor/categoria, em ordem alfabética."""
+    selected = list(titles or [])
+    rows = filter_rows(filter_index, author=author, category=category)
+    if rows is not None:
+        selected += sorted(df['Title'].iloc[rows].unique())
+    return list(dict.fromkeys(selected))
+
+def _without_nan(value):
+    # JSON não tem NaN: o desvio padrão de um livro com uma só avaliação, por exemplo, vira null.
+    if isinstance(value, dict):
+        return {key: _without_nan(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_without_nan(item) for item in value]
+    if isinstance(value, (float, np.floating)) and not np.isfinite(value):
+        return None
+    return value
+
+def _to_json(value):
+    if isinstance(value, (np.integer, np.floating)):
+        return _without_nan(value.item())
+    if hasattr(value, 'to_dict'):
+        return _without_nan(value.to_dict())
+    raise TypeError(f"Tipo não serializável: {type(value)}")
+
+def run_batch(titles, df, llm, output_path, batch_size=8):
+    """Analisa `titles`, grava um JSON por linha em `output_path` e retorna a vazão em livros por minuto."""
+    start = time.perf_counter()
+    results = generate_book_analyses_batch(df, titles, llm, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for title, result in results.items():
+            f.write(json.dumps(_without_nan({"title": title, **result}), ensure_ascii=False, allow_nan=False, default=_to_json) + "\n")
+
+    books_per_minute = len(results) / elapsed * 60 if elapsed > 0 else float('inf')
+    print(f"{len(results)} livros analisados em {elapsed:.1f}s ({books_per_minute:.1f} livros/min). Resultados em {output_path}")
+    return books_per_minute
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--titles', nargs='*', default=[], help="Títulos a analisar")
+    parser.add_argument('--author', help="Analisa todos os livros deste autor")
+    parser.add_argument('--category', help="Analisa todos os livros desta categoria")
+    parser.add_argument('--output', default='data/analises.jsonl')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--full', action='store_true', help="Usa o dataset completo em vez da amostra")
+    parser.add_argument('--no-llm', action='store_true', help="Só estatísticas, com o resumo de exemplo no lugar do LLM")
+    args = parser.parse_args()
+
+    df = load_and_prepare_data(use_sample=not args.full)
+    titles = select_titles(df, build_filter_index(df), author=args.author, category=args.category, titles=args.titles)
+    if not titles:
+        parser.error("Nenhum título selecionado: informe --titles, --author ou --category.")
+
+    llm = None
+    if not args.no_llm:
+        from src.llm_integration import load_base_model_and_tokenizer, create_langchain_llm
+        model, tokenizer = load_base_model_and_tokenizer()
+        llm = create_langchain_llm(model, tokenizer, batch_size=args.batch_size)
+
+    run_batch(titles, df, llm, args.output, batch_size=args.batch_size)
@@ -0,0 +1,80 @@
+import glob
+import hashlib
+import json
+import os
+
+CACHE_DIR = 'data/.cache'
+FINGERPRINT_SAMPLE_BYTES = 1 << 20
+
+def file_fingerprint(path):
+    """
+    Identifica um arquivo de origem pelo tamanho, data de modificação e hash
+    do primeiro e do último MB, evitando ler arquivos de vários GB inteiros.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+        if stat.st_size > FINGERPRINT_SAMPLE_BYTES:
+            f.seek(max(stat.st_size - FINGERPRINT_SAMPLE_BYTES, FINGERPRINT_SAMPLE_BYTES))
+            digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+    return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+def cache_key(source_paths, **params):
+    payload = json.dumps({
+        'sources': [file_fingerprint(path) for path in source_paths],
+        'params': params
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _cache_path(name, key, cache_dir):
+    return os.path.join(cache_dir, f'prepared_{name}_{key}.arrow')
+
+def load_cached_frame(name, key, cache_dir=CACHE_DIR):
+    """
+    Lê o DataFrame preparado do cache em Arrow/Feather (memory-mapped, com uma
+    cópia na conversão para pandas). Retorna None se não houver cache válido
+    para a chave ou se o pyarrow não estiver instalado.
+    """
+    path = _cache_path(name, key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Não foi possível ler o cache {path}: {e}")
+        return None
+
+    list_columns = [field.name for field in table.schema if pa.types.is_list(field.type)]
+    df = table.to_pandas()
+    # O Arrow devolve colunas de lista como arrays numpy; o restante do código espera listas.
+    for column in list_columns:
+        df[column] = df[column].map(list)
+    return df
+
+def save_cached_frame(df, name, key, cache_dir=CACHE_DIR):
+    """
+    Grava o DataFrame preparado em Arrow/Feather de forma atômica e remove versões
+    antigas do mesmo cache (chaves de arquivos de origem anteriores).
+    """
+    path = _cache_path(name, key, cache_dir)
+    tmp_path = path + '.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Sem compressão, a leitura com memory-map não descomprime cada coluna num buffer novo; a conversão
+        # para pandas em load_cached_frame ainda copia os dados uma vez.
+        df.to_feather(tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except (ImportError, OSError, ValueError, TypeError) as e:
+        print(f"Não foi possível gravar o cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    # A chave tem 16 dígitos hexadecimais; o padrão não pode casar com caches de outros nomes com o mesmo prefixo.
+    for stale_path in glob.glob(_cache_path(name, '[0-9a-f]' * 16, cache_dir)):
+        if stale_path != path:
+            os.remove(stale_path)
+    return path
@@ -1,7 +1,27 @@
 import pandas as pd
+import numpy as np
 import ast
 import html
 import re
+from concurrent.futures import ProcessPoolExecutor
+from src.data_cache import cache_key, load_cached_frame, save_cached_frame
+from src.filter_index import build_list_index, csr_gather
+from src.profiling import profiled, stage
+
+RATINGS_PATH = 'data/Books_rating.csv'
+METADATA_PATH = 'data/books_data.csv'
+DEDUP_KEYS = ['User_id', 'Title', 'text', 'score', 'time']
+CATEGORICAL_COLUMNS = ['Title', 'User_id', 'profileName', 'publisher']
+LIST_COLUMNS = ['authors', 'categories']
+HTML_TAG_PATTERN = r'<.*?>'
+# Mesmo conjunto de caracteres que str.isspace() / \s do módulo re, escrito por extenso
+# para que o RE2 do Arrow e o strip() produzam exatamente o resultado do Python.
+PY_WHITESPACE = '\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680' + ''.join(chr(c) for c in range(0x2000, 0x200b)) + '\u2028\u2029\u202f\u205f\u3000'
+# Remover sequências inteiras em vez de caractere a caractere gera o mesmo texto com menos substituições.
+NON_LETTER_PATTERN = '[^a-zA-Z' + ''.join('\\x{%x}' % ord(c) for c in PY_WHITESPACE) + ']+'
+# Incrementar sempre que a preparação mudar, para invalidar o cache em disco.
+PIPELINE_VERSION = 3
+SAMPLE_ROWS = 200000
 
 def parse_list_string(s):
     if isinstance(s, str) and s.startswith('[') and s.endswith(']'):
@@ -20,45 +40,455 @@ def clean_review_text(text):
     text = text.lower().strip()
     return text
 
-def load_and_prepare_data(use_sample=True):
-    nrows_to_load = 200000 if use_sample else None
+def _to_arrow_strings(texts):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    try:
+        arr = pa.array(texts, type=pa.large_string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colunas com valores não textuais: trata-os como texto vazio, como clean_review_text.
+        arr = pa.array([v if isinstance(v, str) else None for v in texts], type=pa.large_string())
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    return pc.fill_null(arr, '') if arr.null_count else arr
 
-    print(f"Carregando dados... Modo de amostragem: {use_sample}, Linhas: {nrows_to_load or 'Todas'}")
+def _clean_review_text_arrow(texts):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    arr = _to_arrow_strings(texts)
 
-    ratings_df = pd.read_csv('data/Books_rating.csv', nrows=nrows_to_load)
-    metadata_df = pd.read_csv('data/books_data.csv')
-    
-    ratings_df = ratings_df.drop_duplicates(subset=['User_id', 'Title', 'text', 'score', 'time'], keep='first')
-    ratings_df = ratings_df.dropna(subset=['Title', 'User_id'])
-    ratings_df['summary'] = ratings_df['summary'].fillna('')
-    ratings_df['text'] = ratings_df['text'].fillna('')
+    has_entity = pc.match_substring(arr, '&')
+    if pc.any(has_entity).as_py():
+        unescaped = [html.unescape(v) for v in arr.filter(has_entity).to_pylist()]
+        arr = pc.replace_with_mask(arr, has_entity, pa.array(unescaped, type=pa.large_string()))
+
+    arr = pc.replace_substring_regex(arr, HTML_TAG_PATTERN, ' ')
+    arr = pc.replace_substring_regex(arr, NON_LETTER_PATTERN, '')
+    # Após a regex só restam letras ASCII e espaços, então ascii_lower equivale a str.lower().
+    return pc.utf8_trim(pc.ascii_lower(arr), PY_WHITESPACE)
+
+def _count_words_arrow(arr):
+    offsets = np.frombuffer(arr.buffers()[1], dtype=np.int64)[arr.offset:arr.offset + len(arr) + 1]
+    data = arr.buffers()[2]
+    chars = np.frombuffer(data, dtype=np.uint8)[:offsets[-1]] if data is not None else np.empty(0, dtype=np.uint8)
+
+    is_letter = (chars >= ord('a')) & (chars <= ord('z'))
+    word_starts = is_letter.copy()
+    word_starts[1:] &= ~is_letter[:-1]
+
+    begins, ends = offsets[:-1], offsets[1:]
+    non_empty = begins < ends
+    # A primeira letra de cada texto inicia uma palavra, mesmo que o texto anterior termine em letra.
+    word_starts[begins[non_empty]] = is_letter[begins[non_empty]]
+
+    counts = np.zeros(len(arr), dtype=np.int64)
+    if non_empty.any():
+        counts[non_empty] = np.add.reduceat(word_starts.view(np.uint8), begins[non_empty], dtype=np.int64)
+    return counts
 
+def _arrow_to_series(arr, index):
+    # Passa por numpy para inferir o dtype de texto da mesma forma que o apply.
+    return pd.Series(arr.to_numpy(zero_copy_only=False), index=index)
+
+def clean_review_text_series(texts):
+    """
+    Versão vetorizada de clean_review_text para uma coluna inteira: as
+    substituições por regex, o lower e o strip rodam em lote no Arrow (C++) e
+    só o html.unescape continua em Python, aplicado apenas aos textos que têm
+    entidades. O resultado é idêntico ao de texts.apply(clean_review_text).
+    """
+    try:
+        arr = _clean_review_text_arrow(texts)
+    except ImportError:
+        return texts.apply(clean_review_text)
+    return _arrow_to_series(arr, texts.index)
+
+def count_words(cleaned_texts):
+    """
+    Conta as palavras de textos já limpos (equivalente a len(x.split())) sem
+    criar a lista de tokens. Após a limpeza só restam letras a-z e espaços,
+    então cada palavra começa numa letra precedida de um não-letra; as
+    contagens saem direto do buffer UTF-8 do Arrow com numpy.
+    """
+    try:
+        arr = _to_arrow_strings(cleaned_texts)
+    except ImportError:
+        return cleaned_texts.apply(lambda x: len(x.split()))
+    return pd.Series(_count_words_arrow(arr), index=cleaned_texts.index)
+
+def _clean_and_count(texts):
+    try:
+        arr = _clean_review_text_arrow(texts)
+    except ImportError:
+        cleaned = texts.apply(clean_review_text)
+        return cleaned, cleaned.apply(lambda x: len(x.split()))
+    return _arrow_to_series(arr, texts.index), pd.Series(_count_words_arrow(arr), index=texts.index)
+
+def _run_serial(func, data):
+    return [func(data)]
+
+def _partitioned_runner(executor, n_partitions):
+    """
+    Retorna uma função run(func, data) que divide `data` em até `n_partitions`
+    fatias contíguas e aplica `func` a cada uma no pool de processos. Os
+    resultados voltam na ordem das fatias, então concatená-los reproduz
+    exatamente o resultado serial, qualquer que seja o número de workers.
+    """
+    def run(func, data):
+        n = min(n_partitions, len(data))
+        if n <= 1:
+            return [func(data)]
+        bounds = np.linspace(0, len(data), n + 1).astype(int)
+        partitions = [data.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        return list(executor.map(func, partitions))
+    return run
+
+def _parse_list_columns(metadata_df):
+    return metadata_df['authors'].apply(parse_list_string), metadata_df['categories'].apply(parse_list_string)
+
+def _prepare_metadata(metadata_df, run=_run_serial):
     metadata_df = metadata_df.dropna(subset=['Title', 'authors'])
     metadata_df['publisher'] = metadata_df['publisher'].fillna('Editora desconhecida')
     metadata_df['description'] = metadata_df['description'].fillna('Descrição não disponível')
-    
-    metadata_df['authors'] = metadata_df['authors'].apply(parse_list_string)
-    metadata_df['categories'] = metadata_df['categories'].apply(parse_list_string)
-    
+
+    parsed = run(_parse_list_columns, metadata_df[['authors', 'categories']])
+    metadata_df['authors'] = pd.concat([authors for authors, _ in parsed])
+    metadata_df['categories'] = pd.concat([categories for _, categories in parsed])
+
     metadata_df.loc[metadata_df['authors'].apply(len) == 0, 'authors'] = pd.Series([['Autor Desconhecido']] * len(metadata_df))
     metadata_df.loc[metadata_df['categories'].apply(len) == 0, 'categories'] = pd.Series([['Sem Categoria']] * len(metadata_df))
-    
-    df = pd.merge(ratings_df, metadata_df, on='Title', how='left')
+    return metadata_df
+
+def _clean_ratings(ratings_df):
+    ratings_df = ratings_df.dropna(subset=['Title', 'User_id'])
+    ratings_df['summary'] = ratings_df['summary'].fillna('')
+    ratings_df['text'] = ratings_df['text'].fillna('')
+    return ratings_df
 
-    df['authors'] = df['authors'].apply(lambda d: d if isinstance(d, list) else ['Autor Desconhecido'])
-    df['categories'] = df['categories'].apply(lambda d: d if isinstance(d, list) else ['Sem Categoria'])
+def _merge_and_enrich(ratings_df, metadata_df, run=_run_serial):
+    with stage('merge', rows=len(ratings_df)):
+        df = pd.merge(ratings_df, metadata_df, on='Title', how='left')
+
+        df['authors'] = df['authors'].apply(lambda d: d if isinstance(d, list) else ['Autor Desconhecido'])
+        df['categories'] = df['categories'].apply(lambda d: d if isinstance(d, list) else ['Sem Categoria'])
 
     df['full_review_text'] = df['summary'] + '. ' + df['text']
-    df['cleaned_review_text'] = df['full_review_text'].apply(clean_review_text)
+    with stage('clean_text', rows=len(df)):
+        cleaned = run(_clean_and_count, df['full_review_text'])
+    df['cleaned_review_text'] = pd.concat([texts for texts, _ in cleaned])
     df['review_time'] = pd.to_datetime(df['time'], unit='s')
-    
-    df['review_length'] = df['cleaned_review_text'].apply(lambda x: len(x.split()))
-    
-    user_stats = df.groupby('User_id').agg(
-        user_review_count=('Title', 'count'),
-        user_avg_score=('score', 'mean')
-    ).reset_index()
-    
-    df = pd.merge(df, user_stats, on='User_id', how='left')
-    
-    return df
\ No newline at end of file
+
+    df['review_length'] = pd.concat([lengths for _, lengths in cleaned])
+    return df
+
+def _dedup_key_hashes(ratings_df):
+    # Colunas de texto viram object para que o hash de um valor (inclusive NaN)
+    # não dependa do dtype inferido em cada chunk.
+    keys = ratings_df[DEDUP_KEYS].astype({'User_id': object, 'Title': object, 'text': object})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+def _mark_new_keys(keys, seen_keys):
+    """
+    Marca a primeira ocorrência de cada hash ainda não visto e retorna
+    (máscara, seen_keys atualizado). seen_keys fica ordenado: só o bloco é
+    ordenado e os hashes novos são intercalados por busca binária, sem
+    reordenar os dos blocos anteriores.
+    """
+    chunk_keys, first_rows = np.unique(keys, return_index=True)
+    positions = np.searchsorted(seen_keys, chunk_keys)
+    seen = positions < len(seen_keys)
+    seen[seen] = seen_keys[positions[seen]] == chunk_keys[seen]
+
+    is_new = np.zeros(len(keys), dtype=bool)
+    is_new[first_rows[~seen]] = True
+    return is_new, np.insert(seen_keys, positions[~seen], chunk_keys[~seen])
+
+@profiled(name='load_ratings_chunked', rows=len)
+def _load_ratings_chunked(nrows, metadata_df, chunksize, run=_run_serial):
+    """
+    Lê o arquivo de avaliações em blocos de `chunksize` linhas, limpando e
+    cruzando cada bloco com os metadados. A deduplicação entre blocos usa o
+    hash das colunas-chave e as estatísticas por usuário são acumuladas
+    incrementalmente, sem cópias do DataFrame completo.
+    """
+    seen_keys = np.empty(0, dtype=np.uint64)
+    user_totals = None
+    parts = []
+
+    for chunk in pd.read_csv(RATINGS_PATH, nrows=nrows, chunksize=chunksize):
+        is_new, seen_keys = _mark_new_keys(_dedup_key_hashes(chunk), seen_keys)
+
+        ratings_chunk = _clean_ratings(chunk[is_new])
+        if ratings_chunk.empty:
+            continue
+
+        part = _merge_and_enrich(ratings_chunk, metadata_df, run)
+        chunk_totals = part.groupby('User_id').agg(count=('Title', 'count'), total=('score', 'sum'))
+        user_totals = chunk_totals if user_totals is None else user_totals.add(chunk_totals, fill_value=0)
+        parts.append(part)
+
+    if not parts:
+        # Nenhuma linha válida: mantém o mesmo esquema do modo em memória.
+        parts.append(_merge_and_enrich(_clean_ratings(chunk.iloc[:0]), metadata_df))
+        user_totals = parts[0].groupby('User_id').agg(count=('Title', 'count'), total=('score', 'sum'))
+
+    df = pd.concat(parts, ignore_index=True)
+    del parts
+
+    counts = user_totals['count'].astype('int64')
+    df['user_review_count'] = df['User_id'].map(counts).astype('int64')
+    df['user_avg_score'] = df['User_id'].map(user_totals['total'] / counts)
+    return df
+
+def _build_prepared_frame(nrows_to_load, chunksize, run=_run_serial):
+    with stage('read_metadata') as record:
+        metadata_df = pd.read_csv(METADATA_PATH)
+        record['rows'] = len(metadata_df)
+    with stage('prepare_metadata', rows=len(metadata_df)):
+        metadata_df = _prepare_metadata(metadata_df, run)
+
+    if chunksize:
+        print(f"Processando avaliações em blocos de {chunksize} linhas...")
+        return _load_ratings_chunked(nrows_to_load, metadata_df, chunksize, run)
+
+    with stage('read_ratings') as record:
+        ratings_df = pd.read_csv(RATINGS_PATH, nrows=nrows_to_load)
+        record['rows'] = len(ratings_df)
+    with stage('dedup', rows=len(ratings_df)):
+        ratings_df = ratings_df.drop_duplicates(subset=DEDUP_KEYS, keep='first')
+        ratings_df = _clean_ratings(ratings_df)
+
+    df = _merge_and_enrich(ratings_df, metadata_df, run)
+
+    with stage('user_stats', rows=len(df)):
+        user_stats = df.groupby('User_id').agg(
+            user_review_count=('Title', 'count'),
+            user_avg_score=('score', 'mean')
+        ).reset_index()
+
+        df = pd.merge(df, user_stats, on='User_id', how='left')
+
+    return df
+
+def _memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+def compact_frame(df):
+    """
+    Converte o DataFrame preparado para a representação compacta: as colunas
+    de texto repetitivas viram categóricas e as listas de autores/categorias
+    saem de cada avaliação e passam a ser guardadas uma vez por livro,
+    codificadas como inteiros (ver build_list_index) e referenciadas pela
+    coluna `book_id`. Um livro é uma combinação distinta de título, autores e
+    categorias: títulos que aparecem em mais de uma linha dos metadados, com
+    listas diferentes, ganham um `book_id` para cada uma.
+
+    Retorna (df_compacto, book_lists); book_lists[coluna] é o índice da lista
+    por livro, consultado com book_list_values e expand_list_columns.
+    """
+    memory_before = _memory_mb(df)
+
+    compact = df.drop(columns=LIST_COLUMNS)
+    for column in CATEGORICAL_COLUMNS:
+        compact[column] = compact[column].astype('category')
+    title_codes = compact['Title'].cat.codes.to_numpy().astype(np.int64)
+    list_keys = np.fromiter(zip(*(map(tuple, df[column]) for column in LIST_COLUMNS)), dtype=object, count=len(df))
+    list_codes, list_values = pd.factorize(list_keys)
+    # Ordem dos livros: por título e, dentro do título, pela primeira ocorrência das listas.
+    _, first_rows, book_ids = np.unique(title_codes * max(len(list_values), 1) + list_codes,
+                                        return_index=True, return_inverse=True)
+    compact['book_id'] = book_ids.reshape(-1).astype(np.int32)
+
+    book_lists = {column: build_list_index(df[column].iloc[first_rows]) for column in LIST_COLUMNS}
+
+    lists_mb = sum(array.nbytes for index in book_lists.values() for array in index.values() if isinstance(array, np.ndarray)) / 2**20
+    print(f"Memória do DataFrame: {memory_before:.1f} MB -> {_memory_mb(compact) + lists_mb:.1f} MB (modo compacto)")
+    return compact, book_lists
+
+def book_list_values(book_lists, column, book_id):
+    """Lista original de `column` ('authors' ou 'categories') do livro `book_id`."""
+    index = book_lists[column]
+    codes = index['codes'][index['row_offsets'][book_id]:index['row_offsets'][book_id + 1]]
+    return list(index['labels'][codes])
+
+def expand_list_columns(df, book_lists, columns=LIST_COLUMNS):
+    """
+    Recria as colunas de lista de um recorte do DataFrame compacto (por
+    exemplo, as linhas de um filtro), no formato esperado pelo app.py.
+    """
+    book_ids = df['book_id'].to_numpy(dtype=np.int64)
+    expanded = df.copy()
+    for column in columns:
+        index = book_lists[column]
+        lengths = index['row_offsets'][book_ids + 1] - index['row_offsets'][book_ids]
+        labels = index['labels'][csr_gather(index['row_offsets'], index['codes'], book_ids)]
+        split_points = np.cumsum(lengths)[:-1]
+        expanded[column] = [list(values) for values in np.split(labels, split_points)] if len(df) else []
+    return expanded
+
+def _cache_name(use_sample):
+    return 'sample' if use_sample else 'full'
+
+def _source_cache_key(nrows):
+    return cache_key([RATINGS_PATH, METADATA_PATH], pipeline_version=PIPELINE_VERSION, nrows=nrows)
+
+def data_version(use_sample=True):
+    """Identifica a versão dos dados preparados: muda com os CSVs de origem e com a PIPELINE_VERSION."""
+    return f'{_cache_name(use_sample)}_{_source_cache_key(SAMPLE_ROWS if use_sample else None)}'
+
+def _appended_name(cache_name, part):
+    return f'{cache_name}_appended_{part}'
+
+def _running_totals(df, by):
+    """Contagem, soma e soma dos quadrados das notas por `by`, para médias e desvios incrementais."""
+    return df.assign(score_sq=df['score'] ** 2).groupby(by).agg(
+        count=('Title', 'count'),
+        total=('score', 'sum'),
+        total_sq=('score_sq', 'sum')
+    )
+
+def totals_to_stats(totals):
+    """Média e desvio padrão amostral (como Series.std) a partir dos totais acumulados."""
+    count = totals['count']
+    mean = totals['total'] / count
+    variance = (totals['total_sq'] - count * mean ** 2) / (count - 1)
+    return pd.DataFrame({'count': count, 'mean': mean, 'std': np.sqrt(variance.clip(lower=0))})
+
+def _load_ingest_state(cache_name, key):
+    df = load_cached_frame(_appended_name(cache_name, 'reviews'), key)
+    if df is None:
+        return None
+    parts = {part: load_cached_frame(_appended_name(cache_name, part), key) for part in ['users', 'books', 'keys']}
+    if any(part is None for part in parts.values()):
+        return None
+    return {
+        'df': df,
+        'user_totals': parts['users'].set_index('User_id'),
+        'book_totals': parts['books'].set_index('Title'),
+        'seen_keys': parts['keys']['key'].to_numpy()
+    }
+
+def _save_ingest_state(state, cache_name, key):
+    save_cached_frame(state['user_totals'].reset_index(), _appended_name(cache_name, 'users'), key)
+    save_cached_frame(state['book_totals'].reset_index(), _appended_name(cache_name, 'books'), key)
+    save_cached_frame(pd.DataFrame({'key': state['seen_keys']}), _appended_name(cache_name, 'keys'), key)
+    # As avaliações por último: sem elas o estado não é carregado, então uma gravação interrompida não deixa estado parcial.
+    save_cached_frame(state['df'], _appended_name(cache_name, 'reviews'), key)
+
+def _initial_ingest_state(df):
+    return {
+        'df': df,
+        'user_totals': _running_totals(df, 'User_id'),
+        'book_totals': _running_totals(df, 'Title'),
+        'seen_keys': np.unique(_dedup_key_hashes(df))
+    }
+
+def append_reviews(new_ratings, use_sample=True):
+    """
+    Acrescenta um novo lote de avaliações (caminho de CSV ou DataFrame no
+    formato de Books_rating.csv) ao DataFrame preparado, sem reprocessar o
+    restante: só as linhas novas são limpas e cruzadas com os metadados, as
+    duplicatas são descartadas pelo hash de DEDUP_KEYS (dentro do lote e
+    contra o que já foi carregado) e os totais por usuário e por livro
+    (contagem, soma e soma dos quadrados das notas) são atualizados.
+
+    O estado atualizado é gravado junto ao cache em disco e passa a ser
+    retornado por load_and_prepare_data enquanto os CSVs de origem não
+    mudarem; se mudarem, os lotes precisam ser reaplicados. As partições
+    mensais de src.trends dos meses do lote também são atualizadas.
+    """
+    cache_name = _cache_name(use_sample)
+    key = _source_cache_key(SAMPLE_ROWS if use_sample else None)
+
+    state = _load_ingest_state(cache_name, key)
+    if state is None:
+        state = _initial_ingest_state(load_and_prepare_data(use_sample=use_sample))
+
+    batch = pd.read_csv(new_ratings) if isinstance(new_ratings, str) else new_ratings
+    batch = _clean_ratings(batch)
+    keys = _dedup_key_hashes(batch)
+    is_new = ~pd.Series(keys).duplicated().to_numpy() & ~np.isin(keys, state['seen_keys'])
+    print(f"Lote com {len(batch)} avaliações válidas, {int(is_new.sum())} novas.")
+    if not is_new.any():
+        return state['df']
+
+    metadata_df = _prepare_metadata(pd.read_csv(METADATA_PATH))
+    part = _merge_and_enrich(batch[is_new], metadata_df)
+
+    user_totals = state['user_totals'].add(_running_totals(part, 'User_id'), fill_value=0)
+    user_totals['count'] = user_totals['count'].astype('int64')
+    book_totals = state['book_totals'].add(_running_totals(part, 'Title'), fill_value=0)
+    book_totals['count'] = book_totals['count'].astype('int64')
+
+    df = pd.concat([state['df'], part], ignore_index=True)
+    # Só os usuários presentes no lote têm as estatísticas recalculadas.
+    affected = df['User_id'].isin(part['User_id'].unique()).to_numpy()
+    affected_users = df.loc[affected, 'User_id']
+    df.loc[affected, 'user_review_count'] = affected_users.map(user_totals['count']).to_numpy()
+    df.loc[affected, 'user_avg_score'] = affected_users.map(user_totals['total'] / user_totals['count']).to_numpy()
+    df['user_review_count'] = df['user_review_count'].astype('int64')
+
+    state = {
+        'df': df,
+        'user_totals': user_totals,
+        'book_totals': book_totals,
+        'seen_keys': np.union1d(state['seen_keys'], keys[is_new])
+    }
+    _save_ingest_state(state, cache_name, key)
+    # Import tardio: src.trends importa este módulo.
+    from src.trends import update_trend_store
+    update_trend_store(part, use_sample)
+    return df
+
+def _prepared_rows(result):
+    return len(result[0] if isinstance(result, tuple) else result)
+
+@profiled(rows=_prepared_rows)
+def load_and_prepare_data(use_sample=True, chunksize=None, use_cache=True, n_workers=1, compact=False):
+    """
+    Carrega e processa os dados de avaliações e metadados.
+
+    Com `chunksize` definido, o arquivo de avaliações é processado em blocos
+    (modo streaming), limitando o pico de memória ao tamanho do bloco em vez
+    do tamanho do dataset. O resultado é idêntico ao do modo em memória.
+
+    Com `use_cache`, o DataFrame preparado é gravado em formato colunar (Arrow) e reutilizado
+    entre processos enquanto os CSVs de origem e a PIPELINE_VERSION não mudarem.
+
+    Com `n_workers` > 1, o parsing de autores/categorias e a limpeza do texto
+    rodam em paralelo num pool de processos. Merges e agregados continuam no
+    processo principal, e o resultado não depende do número de workers.
+
+    Lotes acrescentados com append_reviews são incluídos quando `use_cache`
+    está ativo.
+
+    Com `compact`, retorna (df, book_lists) na representação compacta de
+    compact_frame, reportando o uso de memória antes e depois.
+    """
+    nrows_to_load = SAMPLE_ROWS if use_sample else None
+
+    print(f"Carregando dados... Modo de amostragem: {use_sample}, Linhas: {nrows_to_load or 'Todas'}")
+
+    if use_cache:
+        cache_name = _cache_name(use_sample)
+        key = _source_cache_key(nrows_to_load)
+        with stage('load_cache'):
+            df = load_cached_frame(_appended_name(cache_name, 'reviews'), key)
+            if df is None:
+                df = load_cached_frame(cache_name, key)
+        if df is not None:
+            print(f"Dados carregados do cache ({cache_name}, {key}).")
+            return compact_frame(df) if compact else df
+
+    if n_workers > 1:
+        print(f"Pré-processamento paralelo com {n_workers} workers...")
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            df = _build_prepared_frame(nrows_to_load, chunksize, _partitioned_runner(executor, n_workers))
+    else:
+        df = _build_prepared_frame(nrows_to_load, chunksize)
+
+    if use_cache:
+        with stage('save_cache', rows=len(df)):
+            save_cached_frame(df, cache_name, key)
+
+    return compact_frame(df) if compact else df
@@ -0,0 +1,144 @@
+import itertools
+import numpy as np
+import pandas as pd
+from src.profiling import profiled
+
+INDEXED_COLUMNS = ['authors', 'categories']
+
+def csr_gather(offsets, values, positions):
+    """
+    Concatena as fatias values[offsets[p]:offsets[p + 1]] de cada posição em
+    `positions`, sem laço em Python.
+    """
+    starts = offsets[positions]
+    lengths = offsets[positions + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return values[:0]
+    # Para cada elemento de saída: início da sua fatia + deslocamento dentro dela.
+    slice_begins = np.cumsum(lengths) - lengths
+    gather = np.repeat(starts - slice_begins, lengths) + np.arange(total)
+    return values[gather]
+
+def build_list_index(list_series):
+    """
+    Monta um índice invertido para uma coluna de listas (autores ou categorias).
+
+    Os rótulos viram códigos inteiros em ordem alfabética, e as posições das
+    linhas ficam em arrays no estilo CSR nos dois sentidos:
+    - rótulo → linhas: rows[offsets[c]:offsets[c + 1]], em ordem crescente;
+    - linha → rótulos: codes[row_offsets[r]:row_offsets[r + 1]].
+    """
+    lengths = list_series.map(len).to_numpy(dtype=np.int64)
+    positions = np.repeat(np.arange(len(list_series), dtype=np.int64), lengths)
+    flat_labels = np.fromiter(itertools.chain.from_iterable(list_series), dtype=object, count=int(lengths.sum()))
+    codes, labels = pd.factorize(flat_labels, sort=True)
+
+    # Um rótulo repetido na mesma lista conta uma vez só para aquela linha.
+    pairs = np.unique(codes.astype(np.int64) * max(len(list_series), 1) + positions)
+    label_codes, label_rows = np.divmod(pairs, max(len(list_series), 1))
+
+    offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(label_codes, minlength=len(labels)), out=offsets[1:])
+    row_offsets = np.zeros(len(list_series) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=row_offsets[1:])
+
+    return {
+        'labels': np.asarray(labels, dtype=object),
+        'options': list(labels),
+        'lookup': {label: code for code, label in enumerate(labels)},
+        'offsets': offsets,
+        'rows': label_rows,
+        'row_offsets': row_offsets,
+        'codes': codes.astype(np.int64)
+    }
+
+@profiled()
+def build_filter_index(df):
+    """
+    Índices invertidos de autores e categorias do DataFrame preparado, com as
+    listas de opções já ordenadas para os filtros da barra lateral.
+    """
+    return {column: build_list_index(df[column]) for column in INDEXED_COLUMNS}
+
+def rows_for_label(list_index, label):
+    """Posições (ordenadas) das linhas cuja lista contém `label`."""
+    code = list_index['lookup'].get(label)
+    if code is None:
+        return list_index['rows'][:0]
+    return list_index['rows'][list_index['offsets'][code]:list_index['offsets'][code + 1]]
+
+def filter_rows(filter_index, author=None, category=None):
+    """
+    Posições das linhas que contêm o autor e a categoria informados (ambos
+    opcionais), na ordem original do DataFrame. Retorna None sem filtros.
+    """
+    selected = []
+    if author is not None:
+        selected.append(rows_for_label(filter_index['authors'], author))
+    if category is not None:
+        selected.append(rows_for_label(filter_index['categories'], category))
+    if not selected:
+        return None
+    rows = selected[0]
+    for other in selected[1:]:
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+def sort_by_title(df):
+    """
+    DataFrame com as avaliações de cada título em linhas contíguas e índice
+    0..n-1. A ordenação é estável: dentro de cada livro a ordem original é
+    mantida.
+    """
+    return df.sort_values('Title', kind='stable', ignore_index=True)
+
+def _join_display(labels):
+    return ', '.join(map(str, labels))
+
+@profiled()
+def build_book_index(df):
+    """
+    Índice dos livros de um DataFrame ordenado por sort_by_title:
+    - título → faixa de linhas: offsets[b]:offsets[b + 1] do livro b (no
+      estilo CSR de build_list_index), sem cópia ao fatiar;
+    - linha → grupo da tabela de livros (título, autores e categorias), com
+      os textos de exibição de cada grupo já montados.
+    """
+    titles = df['Title'].to_numpy(dtype=object)
+    starts = np.flatnonzero(titles[1:] != titles[:-1]) + 1 if len(titles) else np.empty(0, dtype=np.int64)
+    offsets = np.concatenate([[0], starts, [len(titles)]]).astype(np.int64) if len(titles) else np.zeros(1, dtype=np.int64)
+    labels = titles[offsets[:-1]]
+
+    display = pd.DataFrame({
+        'Title': titles,
+        'authors_str': df['authors'].map(_join_display).to_numpy(dtype=object),
+        'categories_str': df['categories'].map(_join_display).to_numpy(dtype=object)
+    })
+    row_groups = display.groupby(['Title', 'authors_str', 'categories_str'], sort=False).ngroup().to_numpy(dtype=np.int64)
+    _, first_rows = np.unique(row_groups, return_index=True)
+
+    return {
+        'labels': labels,
+        'lookup': {title: book for book, title in enumerate(labels)},
+        'offsets': offsets,
+        'row_groups': row_groups,
+        'groups': display.iloc[first_rows].reset_index(drop=True)
+    }
+
+def book_rows(book_index, title):
+    """Faixa de linhas (slice) das avaliações do título; vazia se ele não existir."""
+    book = book_index['lookup'].get(title)
+    if book is None:
+        return slice(0, 0)
+    return slice(int(book_index['offsets'][book]), int(book_index['offsets'][book + 1]))
+
+def book_slice(df, book_index, title):
+    """Avaliações do título como uma fatia contígua de `df`, sem copiar os dados."""
+    return df.iloc[book_rows(book_index, title)]
+
+def category_options_for_author(filter_index, author):
+    """Categorias, em ordem alfabética, dos livros do autor informado."""
+    categories = filter_index['categories']
+    codes = csr_gather(categories['row_offsets'], categories['codes'], rows_for_label(filter_index['authors'], author))
+    return list(categories['labels'][np.unique(codes)])
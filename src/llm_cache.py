@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+LLM_CACHE_PATH = 'data/.cache/llm_responses.sqlite'
+LLM_CACHE_MAX_BYTES = 64 * 2**20
+
+def llm_identity(llm):
+    """
+    Identifica o modelo e os parâmetros de geração de um LLM do LangChain. Usa
+    o `metadata` preenchido por create_langchain_llm e, na falta dele, os
+    parâmetros que o próprio LangChain expõe.
+    """
+    if getattr(llm, 'metadata', None):
+        return llm.metadata
+    return {'type': type(llm).__name__, 'params': getattr(llm, '_identifying_params', {})}
+
+def llm_cache_key(llm, prompt_text):
+    """
+    Chave por conteúdo: hash do modelo, dos parâmetros de geração e do prompt
+    completo já formatado (template, instruções de formato e as avaliações
+    enviadas). Qualquer mudança nas avaliações ou no template gera outra chave.
+    """
+    payload = json.dumps({'llm': llm_identity(llm), 'prompt': prompt_text}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+    )
+    return conn
+
+def load_cached_response(key, path=LLM_CACHE_PATH):
+    """Resposta guardada para a chave (atualizando o último acesso), ou None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        # closing() fecha a conexão; o `with conn` faz o commit da transação.
+        with closing(_connect(path)) as conn, conn:
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+    except (sqlite3.Error, OSError) as e:
+        print(f"Não foi possível ler o cache de respostas {path}: {e}")
+        return None
+    return json.loads(row[0]) if row is not None else None
+
+def save_cached_response(key, value, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES):
+    """
+    Grava a resposta (serializável em JSON) e remove as entradas usadas há
+    mais tempo até o total caber em `max_bytes` (LRU).
+    """
+    data = json.dumps(value, ensure_ascii=False)
+    try:
+        with closing(_connect(path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data.encode('utf-8')), time.time())
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS running FROM responses) "
+                "WHERE running > ?)",
+                (max_bytes,)
+            )
+    except (sqlite3.Error, OSError) as e:
+        print(f"Não foi possível gravar o cache de respostas {path}: {e}")
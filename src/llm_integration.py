@@ -1,52 +1,206 @@
+import threading
+from typing import Any
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, pipeline
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, TextIteratorStreamer, pipeline
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
 from langchain_huggingface import HuggingFacePipeline
+from pydantic import Field, PrivateAttr
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def load_base_model_and_tokenizer():
+MODEL_ID = "microsoft/Phi-3-mini-4k-instruct"
+#MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.2"
+GENERATION_SETTINGS = {"max_new_tokens": 512, "temperature": 0.7, "do_sample": True}
+# cuda_fp16: caminho original; cuda_4bit: bitsandbytes NF4; cpu_int8: quantização dinâmica int8 do PyTorch.
+BACKENDS = ("cuda_fp16", "cuda_4bit", "cpu_int8")
+# Tempo máximo de espera por cada novo pedaço do texto transmitido (o mesmo do HuggingFacePipeline).
+STREAM_TIMEOUT_S = 60.0
+
+def default_backend():
+    return "cuda_fp16" if torch.cuda.is_available() else "cpu_int8"
+
+def load_base_model_and_tokenizer(backend=None, num_threads=None):
     """
-    Carrega o modelo base e o tokenizer do Hugging Face usando o token 
+    Carrega o modelo base e o tokenizer do Hugging Face usando o token
     armazenado de forma segura no arquivo .env.
+
+    `backend` escolhe entre BACKENDS (padrão: cuda_fp16 com GPU, cpu_int8 sem).
+    No cpu_int8 o modelo é carregado em fp32 e as camadas Linear são
+    quantizadas dinamicamente para int8; `num_threads` (ou a variável de
+    ambiente LLM_NUM_THREADS) limita as threads do PyTorch.
     """
-    model_id = "microsoft/Phi-3-mini-4k-instruct"
-    #model_id = "mistralai/Mistral-7B-Instruct-v0.2"
+    model_id = MODEL_ID
+    backend = backend or default_backend()
     hf_token = os.getenv("HUGGING_FACE_TOKEN")
 
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend '{backend}' desconhecido. Opções: {', '.join(BACKENDS)}.")
     if not hf_token:
         raise ValueError("Token do Hugging Face não encontrado! Verifique se seu arquivo .env está correto e no lugar certo.")
 
-    # quantization_config = BitsAndBytesConfig(
-    #      load_in_4bit=True, 
-    #      bnb_4bit_quant_type="nf4", 
-    #      bnb_4bit_compute_dtype=torch.float16
-    #  )
-    
     tokenizer = AutoTokenizer.from_pretrained(model_id, token=hf_token)
+
+    if backend == "cpu_int8":
+        num_threads = num_threads or int(os.getenv("LLM_NUM_THREADS", "0"))
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        model = AutoModelForCausalLM.from_pretrained(
+            model_id,
+            token=hf_token,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True
+        )
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+        return model, tokenizer
+
+    quantization_config = None
+    if backend == "cuda_4bit":
+        quantization_config = BitsAndBytesConfig(
+             load_in_4bit=True,
+             bnb_4bit_quant_type="nf4",
+             bnb_4bit_compute_dtype=torch.float16
+         )
+
     model = AutoModelForCausalLM.from_pretrained(
-        model_id, 
-        #quantization_config=quantization_config, 
-        device_map="auto", 
+        model_id,
+        quantization_config=quantization_config,
+        device_map="auto",
         token=hf_token,
         torch_dtype=torch.float16
     )
     return model, tokenizer
 
-def create_langchain_llm(model, tokenizer):
+def _crop_cache(cache, length):
+    # Valor negativo: quantos tokens remover do fim (o corte por tamanho absoluto está obsoleto no transformers).
+    excess = cache.get_seq_length() - length
+    if excess > 0:
+        cache.crop(-excess)
+
+class PrefixCachedLLM(LLM):
+    """
+    LLM do LangChain que chama model.generate diretamente e reaproveita o KV
+    cache do prompt anterior: os prompts do dashboard começam pelo mesmo
+    trecho fixo do template, então só os tokens a partir do primeiro que
+    difere precisam ser processados de novo. Usado no backend de CPU, onde o
+    processamento do prompt domina o tempo até o primeiro token.
+    """
+    model: Any
+    tokenizer: Any
+    generation_settings: dict = Field(default_factory=lambda: dict(GENERATION_SETTINGS))
+    _cached_ids: Any = PrivateAttr(default=None)
+    _cached_kv: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return "prefix_cached_transformers"
+
+    @property
+    def _identifying_params(self):
+        return {"model_id": self.model.name_or_path, **self.generation_settings}
+
+    def _reusable_cache(self, input_ids):
+        if self._cached_kv is None:
+            return None
+        # Pelo menos um token do prompt novo precisa passar pelo modelo.
+        limit = min(len(self._cached_ids), input_ids.shape[1] - 1)
+        matches = self._cached_ids[:limit] == input_ids[0, :limit]
+        common = limit if bool(matches.all()) else int(matches.to(torch.int8).argmin())
+        if common == 0:
+            return None
+        _crop_cache(self._cached_kv, common)
+        return self._cached_kv
+
+    def _generate_text(self, prompt, streamer=None):
+        input_ids = self.tokenizer(prompt, return_tensors="pt").input_ids.to(self.model.device)
+        with self._lock, torch.inference_mode():
+            try:
+                output = self.model.generate(
+                    input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=self._reusable_cache(input_ids),
+                    streamer=streamer,
+                    return_dict_in_generate=True,
+                    pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id,
+                    **self.generation_settings
+                )
+            except Exception:
+                # O generate altera o cache no lugar; depois de uma falha ele não é mais confiável.
+                self._cached_kv = self._cached_ids = None
+                raise
+            # Guarda só a parte do cache que corresponde ao prompt, para o próximo pedido.
+            self._cached_kv = output.past_key_values
+            _crop_cache(self._cached_kv, input_ids.shape[1])
+            self._cached_ids = input_ids[0]
+        return self.tokenizer.decode(output.sequences[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return self._generate_text(prompt)
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        streamer = TextIteratorStreamer(self.tokenizer, timeout=STREAM_TIMEOUT_S, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def generate():
+            try:
+                self._generate_text(prompt, streamer)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                # Sem o end(), uma falha no generate deixaria o laço abaixo esperando para sempre.
+                streamer.end()
+
+        thread = threading.Thread(target=generate)
+        thread.start()
+        for text in streamer:
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        thread.join()
+        if errors:
+            raise errors[0]
+
+def create_langchain_llm(model, tokenizer, batch_size=1, backend=None):
     """
     Cria um objeto LLM compatível com o LangChain a partir de um modelo e tokenizer locais.
     Este objeto será usado nas 'chains' do LangChain.
+
+    `llm.stream(...)` (e `chain.stream`) transmite os tokens à medida que são
+    gerados, via TextIteratorStreamer do transformers.
+
+    Com `batch_size` > 1, `chain.batch` gera os prompts em grupos desse tamanho,
+    com padding à esquerda (necessário para geração em lote em modelos só-decoder).
+
+    Modelos na CPU usam PrefixCachedLLM (reaproveita o KV cache do trecho fixo
+    dos prompts) e geram um prompt por vez.
     """
+    backend = backend or ("cpu_int8" if model.device.type == "cpu" else default_backend())
+    # Identifica modelo, backend e parâmetros de geração nas chaves do cache de respostas (src/llm_cache.py).
+    # return_full_text entra na identidade para não reaproveitar respostas antigas que traziam o prompt junto.
+    metadata = {"model_id": model.name_or_path, "backend": backend, "dtype": str(model.dtype), "generation": GENERATION_SETTINGS,
+                "return_full_text": False}
+
+    if model.device.type == "cpu":
+        return PrefixCachedLLM(model=model, tokenizer=tokenizer, metadata=metadata)
+
+    if batch_size > 1:
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+
     pipe = pipeline(
         "text-generation",
         model=model,
         tokenizer=tokenizer,
-        max_new_tokens=512,
-        temperature=0.7,
-        do_sample=True
+        batch_size=batch_size,
+        # Só o texto gerado, como no streaming (skip_prompt): invoke, batch e stream devolvem o mesmo texto.
+        return_full_text=False,
+        **GENERATION_SETTINGS
     )
-    llm = HuggingFacePipeline(pipeline=pipe)
+    llm = HuggingFacePipeline(pipeline=pipe, batch_size=batch_size, metadata=metadata)
     return llm
-
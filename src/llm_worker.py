@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from src.profiling import current_profiling_scope, profiling_scope
+from src.analysis import (
+    generate_book_analyses_batch, generate_book_analysis_langchain,
+    generate_follow_up_answer, generate_follow_up_answers_batch
+)
+
+MAX_BATCH_SIZE = 8
+# Quanto o worker espera por outros pedidos depois do primeiro antes de gerar o lote.
+BATCH_WINDOW_S = 0.05
+LATENCY_HISTORY = 200
+
+class LLMWorker:
+    """
+    Worker único, numa thread em segundo plano, dono do LLM compartilhado por
+    todas as sessões do Streamlit. Os pedidos de resumo e de pergunta entram
+    numa fila e são devolvidos como Futures; pedidos que chegam com até
+    `batch_window` segundos de diferença são gerados juntos (até
+    `max_batch_size`, limitado ao batch_size do LLM), com chain.batch. Um
+    pedido com `on_token` que chega sozinho é transmitido token a token
+    (on_token é chamado a partir da thread do worker); num lote, recebe só o
+    resultado final.
+
+    LLMs que geram um prompt por vez (PrefixCachedLLM, na CPU) não têm
+    batch_size: nesse caso o worker atende um pedido de cada vez, sem
+    esperar pelos seguintes.
+    """
+
+    def __init__(self, llm, max_batch_size=MAX_BATCH_SIZE, batch_window=BATCH_WINDOW_S):
+        self.llm = llm
+        self.max_batch_size = min(max_batch_size, getattr(llm, 'batch_size', 1))
+        self.batch_window = batch_window if self.max_batch_size > 1 else 0
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=LATENCY_HISTORY)
+        self._batch_sizes = deque(maxlen=LATENCY_HISTORY)
+        self._jobs_done = 0
+        # stats() é chamado das sessões do Streamlit enquanto a thread do worker atualiza as métricas.
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="llm-worker", daemon=True)
+        self._thread.start()
+
+    def submit_summary(self, book_df, book_title, on_token=None):
+        """Enfileira uma análise de livro; o Future resolve no dicionário de generate_book_analysis_langchain."""
+        return self._submit('summary', (book_df, book_title), on_token)
+
+    def submit_follow_up(self, book_df, book_title, question, on_token=None):
+        """Enfileira uma pergunta sobre o livro; o Future resolve no texto da resposta."""
+        return self._submit('follow_up', (book_df, book_title, question), on_token)
+
+    def _submit(self, kind, args, on_token):
+        future = Future()
+        self._queue.put({'kind': kind, 'args': args, 'on_token': on_token, 'future': future, 'submitted': time.perf_counter(),
+                         'profiling': current_profiling_scope()})
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """Profundidade da fila e latência dos pedidos (da submissão à resposta) recentes."""
+        with self._stats_lock:
+            latencies = np.array(self._latencies)
+            batch_sizes = list(self._batch_sizes)
+            jobs_done = self._jobs_done
+        return {
+            'queue_depth': self._queue.qsize(),
+            'jobs_done': jobs_done,
+            'avg_latency_s': float(latencies.mean()) if len(latencies) else None,
+            'p95_latency_s': float(np.percentile(latencies, 95)) if len(latencies) else None,
+            'avg_batch_size': float(np.mean(batch_sizes)) if batch_sizes else None
+        }
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        jobs = [first]
+        deadline = time.perf_counter() + self.batch_window
+        while len(jobs) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                # Encerra depois de processar o que já foi recebido.
+                self._queue.put(None)
+                break
+            jobs.append(job)
+        return jobs
+
+    def _run(self):
+        while (jobs := self._next_batch()) is not None:
+            if len(jobs) == 1 and jobs[0]['on_token']:
+                self._execute(jobs, self._run_streaming)
+                continue
+            for kind, run in [('summary', self._run_summaries), ('follow_up', self._run_follow_ups)]:
+                group = [job for job in jobs if job['kind'] == kind]
+                if group:
+                    self._execute(group, run)
+
+    def _execute(self, jobs, run):
+        # A instrumentação segue quem pediu: ligada se algum pedido do lote a tinha ligada,
+        # com a sessão marcada quando o lote todo vem da mesma sessão.
+        sessions = {job['profiling'][1] for job in jobs}
+        enabled = any(job['profiling'][0] for job in jobs)
+        try:
+            with profiling_scope(enabled, sessions.pop() if len(sessions) == 1 else None):
+                results = run(jobs)
+        except Exception as e:
+            for job in jobs:
+                job['future'].set_exception(e)
+        else:
+            for job, result in zip(jobs, results):
+                job['future'].set_result(result)
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self._latencies.extend(finished - job['submitted'] for job in jobs)
+            self._batch_sizes.append(len(jobs))
+            self._jobs_done += len(jobs)
+
+    def _run_streaming(self, jobs):
+        job = jobs[0]
+        if job['kind'] == 'summary':
+            return [generate_book_analysis_langchain(*job['args'], self.llm, on_token=job['on_token'])]
+        return [generate_follow_up_answer(*job['args'], self.llm, on_token=job['on_token'])]
+
+    def _run_summaries(self, jobs):
+        titles = [job['args'][1] for job in jobs]
+        books_df = pd.concat([job['args'][0] for job in jobs])
+        # Pedidos repetidos do mesmo livro trazem as mesmas linhas do DataFrame.
+        books_df = books_df[~books_df.index.duplicated()]
+        results = generate_book_analyses_batch(books_df, titles, self.llm, batch_size=len(jobs))
+        return [results[title] for title in titles]
+
+    def _run_follow_ups(self, jobs):
+        return generate_follow_up_answers_batch([job['args'] for job in jobs], self.llm)
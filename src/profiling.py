@@ -0,0 +1,175 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+PROFILE_LOG_PATH = 'data/.cache/profile.jsonl'
+PROFILE_HISTORY = 200
+# Intervalo de amostragem do RSS enquanto há etapas em andamento.
+RSS_SAMPLE_INTERVAL_S = 0.01
+STATM_PATH = '/proc/self/statm'
+
+# PROFILE_STAGES=1 liga a instrumentação desde o início; enable_profiling muda o padrão do processo e
+# profiling_scope / set_profiling_scope o sobrepõem só no contexto atual (por exemplo, uma sessão do Streamlit).
+_enabled = os.getenv('PROFILE_STAGES', '') not in ('', '0')
+_scope = contextvars.ContextVar('profiling_scope', default=None)
+_recent = deque(maxlen=PROFILE_HISTORY)
+_local = threading.local()
+_log_lock = threading.Lock()
+# Picos de RSS das etapas em andamento (em todas as threads), atualizados pela thread de amostragem.
+_active_peaks = {}
+_sampler_lock = threading.Lock()
+_sampler = None
+
+def profiling_enabled():
+    scope = _scope.get()
+    return _enabled if scope is None else scope[0]
+
+def enable_profiling(enabled=True):
+    """Liga ou desliga a instrumentação por padrão no processo (contextos sem escopo próprio)."""
+    global _enabled
+    _enabled = enabled
+
+def current_profiling_scope():
+    """(ligada, sessão) do contexto atual, para repassar a outra thread com profiling_scope."""
+    scope = _scope.get()
+    return scope if scope is not None else (_enabled, None)
+
+def set_profiling_scope(enabled, session=None):
+    """
+    Liga ou desliga a instrumentação só no contexto atual (a thread que roda
+    o script de uma sessão do Streamlit), marcando os registros com `session`.
+    """
+    _scope.set((enabled, session))
+
+@contextmanager
+def profiling_scope(enabled, session=None):
+    """Como set_profiling_scope, restaurando o escopo anterior ao sair do `with`."""
+    token = _scope.set((enabled, session))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+def _current_rss_mb():
+    # RSS atual (não o pico do processo inteiro, que não volta a cair); fora do Linux não é medido.
+    try:
+        with open(STATM_PATH) as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+def _sample_rss():
+    global _sampler
+    while True:
+        rss = _current_rss_mb()
+        with _sampler_lock:
+            if not _active_peaks:
+                _sampler = None
+                return
+            for token, peak in _active_peaks.items():
+                if rss is not None and rss > peak:
+                    _active_peaks[token] = rss
+        time.sleep(RSS_SAMPLE_INTERVAL_S)
+
+def _start_peak_tracking(token, rss):
+    global _sampler
+    with _sampler_lock:
+        _active_peaks[token] = rss
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_rss, name="rss-sampler", daemon=True)
+            _sampler.start()
+
+def _stop_peak_tracking(token, rss):
+    with _sampler_lock:
+        return max(_active_peaks.pop(token), rss)
+
+def _emit(record):
+    _recent.append(record)
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(PROFILE_LOG_PATH), exist_ok=True)
+            with open(PROFILE_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+    except OSError as e:
+        print(f"Não foi possível gravar o log de instrumentação {PROFILE_LOG_PATH}: {e}")
+
+@contextmanager
+def _measure(name, fields):
+    stack = _local.__dict__.setdefault('stack', [])
+    record = {'stage': '/'.join(stack + [name]), 'session': current_profiling_scope()[1], **fields}
+    stack.append(name)
+    rss_before = _current_rss_mb()
+    token = object()
+    if rss_before is not None:
+        _start_peak_tracking(token, rss_before)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['wall_s'] = round(time.perf_counter() - start, 6)
+        if rss_before is not None:
+            rss_after = _current_rss_mb()
+            # Crescimento do RSS: no fim da etapa e no maior valor amostrado durante ela.
+            record['rss_delta_mb'] = round(rss_after - rss_before, 1)
+            record['peak_rss_delta_mb'] = round(_stop_peak_tracking(token, rss_after) - rss_before, 1)
+        else:
+            record['rss_delta_mb'] = record['peak_rss_delta_mb'] = None
+        record['timestamp'] = time.time()
+        stack.pop()
+        _emit(record)
+
+def stage(name, **fields):
+    """
+    Context manager que mede uma etapa: tempo de parede e quanto o RSS do
+    processo cresceu, no fim da etapa e no pico (amostrado a cada
+    RSS_SAMPLE_INTERVAL_S) durante ela. O registro (um dicionário) é
+    devolvido no `with`, para que a etapa acrescente campos como `rows` ou
+    contagens de tokens; etapas aninhadas ficam com o nome do caminho
+    ("load_and_prepare_data/merge"). Cada registro vai para o log JSON Lines
+    em PROFILE_LOG_PATH e para recent_stages().
+
+    Com a instrumentação desligada, não mede nada e devolve um dicionário
+    descartável.
+    """
+    if not profiling_enabled():
+        return nullcontext({})
+    return _measure(name, fields)
+
+def profiled(name=None, rows=None):
+    """
+    Decorator equivalente a stage() em volta da função inteira. `rows`,
+    se dado, extrai do resultado o número de linhas registrado.
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiling_enabled():
+                return func(*args, **kwargs)
+            with _measure(label, {}) as record:
+                result = func(*args, **kwargs)
+                if rows:
+                    record['rows'] = rows(result)
+            return result
+        return wrapper
+    return decorator
+
+def recent_stages(session=None):
+    """
+    Registros mais recentes (até PROFILE_HISTORY), do mais antigo ao mais
+    novo; com `session`, só os marcados com essa sessão.
+    """
+    records = list(_recent)
+    if session is None:
+        return records
+    return [record for record in records if record['session'] == session]
@@ -0,0 +1,195 @@
+import hashlib
+import itertools
+import os
+import shutil
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.data_processing import clean_review_text
+
+RETRIEVAL_DIR = 'data/.cache/retrieval'
+# Acima disso, os índices usados há mais tempo são removidos (LRU pela data de modificação da pasta).
+RETRIEVAL_MAX_BYTES = 256 * 2**20
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+DENSE_MODEL_ID = 'sentence-transformers/all-MiniLM-L6-v2'
+INDEX_ARRAYS = ['term_bytes', 'term_offsets', 'offsets', 'docs', 'tfs', 'doc_lengths']
+
+def approx_token_count(text):
+    # Estimativa conservadora para texto em inglês: ~4 tokens a cada 3 palavras, mais o marcador da lista.
+    return len(text.split()) * 4 // 3 + 2
+
+def texts_key(texts):
+    """Hash do conteúdo das avaliações: muda sempre que o texto de qualquer avaliação mudar."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+def build_bm25_index(texts):
+    """
+    Índice invertido de um conjunto de avaliações já limpas (só letras e
+    espaços): vocabulário ordenado, postings em CSR (documentos e frequência
+    do termo em cada um) e o tamanho de cada documento em palavras.
+
+    O vocabulário fica num único buffer de bytes UTF-8 com offsets (o termo t
+    é term_bytes[term_offsets[t]:term_offsets[t + 1]]): um array de strings
+    de largura fixa ocuparia n_termos × o termo mais longo × 4 bytes.
+    """
+    tokenized = [text.split() for text in texts]
+    doc_lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.int64)
+    tokens = np.fromiter(itertools.chain.from_iterable(tokenized), dtype=object, count=int(doc_lengths.sum()))
+    doc_ids = np.repeat(np.arange(len(tokenized), dtype=np.int64), doc_lengths)
+
+    term_ids, terms = pd.factorize(tokens, sort=True)
+    encoded = [term.encode('utf-8') for term in terms]
+    term_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+    term_bytes = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    pairs, tfs = np.unique(term_ids.astype(np.int64) * max(len(tokenized), 1) + doc_ids, return_counts=True)
+    posting_terms, posting_docs = np.divmod(pairs, max(len(tokenized), 1))
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(posting_terms, minlength=len(terms)), out=offsets[1:])
+    return {'term_bytes': term_bytes, 'term_offsets': term_offsets, 'offsets': offsets, 'docs': posting_docs,
+            'tfs': tfs.astype(np.int64), 'doc_lengths': doc_lengths}
+
+def _term_id(index, term):
+    # Busca binária no vocabulário ordenado; a ordem dos bytes UTF-8 é a mesma dos code points.
+    term_bytes, term_offsets = index['term_bytes'], index['term_offsets']
+    target = term.encode('utf-8')
+    lo, hi = 0, len(term_offsets) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if bytes(term_bytes[term_offsets[mid]:term_offsets[mid + 1]]) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < len(term_offsets) - 1 and bytes(term_bytes[term_offsets[lo]:term_offsets[lo + 1]]) == target:
+        return lo
+    return None
+
+def bm25_scores(index, query):
+    """Pontuação BM25 de cada documento do índice para a pergunta."""
+    doc_lengths = index['doc_lengths']
+    scores = np.zeros(len(doc_lengths))
+    query_terms = set(clean_review_text(query).split())
+    if not len(doc_lengths) or not query_terms:
+        return scores
+
+    positions = [term for term in (_term_id(index, query_term) for query_term in sorted(query_terms)) if term is not None]
+
+    avg_length = max(doc_lengths.mean(), 1)
+    for term in positions:
+        start, stop = index['offsets'][term], index['offsets'][term + 1]
+        docs, tfs = index['docs'][start:stop], index['tfs'][start:stop]
+        idf = np.log(1 + (len(doc_lengths) - len(docs) + 0.5) / (len(docs) + 0.5))
+        norm = tfs + BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[docs] / avg_length)
+        scores[docs] += idf * tfs * (BM25_K1 + 1) / norm
+    return scores
+
+@lru_cache(maxsize=1)
+def _load_dense_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(DENSE_MODEL_ID)
+
+def _index_dir(key, index_dir):
+    return os.path.join(index_dir, key)
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+def _evict_indexes(index_dir, keep, max_bytes):
+    """Remove os índices usados há mais tempo (exceto `keep`) até o total caber em `max_bytes`."""
+    entries = []
+    for entry in os.scandir(index_dir):
+        if entry.is_dir() and not entry.name.endswith('.tmp'):
+            entries.append((entry.stat().st_mtime, entry.path, _dir_size(entry.path)))
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+def load_book_index(texts, use_dense=False, index_dir=RETRIEVAL_DIR, max_bytes=RETRIEVAL_MAX_BYTES):
+    """
+    Índice de recuperação das avaliações de um livro, lido do disco com
+    memory-map quando já existe para esse conteúdo e construído (e gravado)
+    caso contrário. Com `use_dense`, inclui vetores normalizados do
+    sentence-transformers, se o pacote estiver instalado.
+
+    Os índices gravados ficam limitados a `max_bytes` no total; ao passar
+    disso, os usados há mais tempo são removidos.
+    """
+    texts = list(texts)
+    path = _index_dir(texts_key(texts), index_dir)
+    names = INDEX_ARRAYS + (['vectors'] if use_dense else [])
+    if all(os.path.exists(os.path.join(path, f'{name}.npy')) for name in names):
+        try:
+            # Marca o uso para a remoção LRU.
+            os.utime(path)
+        except OSError:
+            pass
+        return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in names}
+
+    index = build_bm25_index(texts)
+    if use_dense:
+        try:
+            index['vectors'] = _load_dense_model().encode(texts, normalize_embeddings=True).astype(np.float32)
+        except ImportError:
+            print("sentence-transformers não instalado; usando apenas BM25.")
+
+    tmp_path = path + '.tmp'
+    try:
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, array in index.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        _evict_indexes(index_dir, path, max_bytes)
+    except OSError as e:
+        print(f"Não foi possível gravar o índice de recuperação {path}: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return index
+
+def _rank(scores):
+    # Ordem decrescente estável: empates mantêm a ordem original das avaliações.
+    return np.argsort(-scores, kind='stable')
+
+def select_reviews_for_question(texts, question, top_k=50, token_budget=2500, use_dense=False, count_tokens=approx_token_count):
+    """
+    Seleciona as avaliações mais relevantes para a pergunta (BM25 e, com
+    `use_dense`, fusão por reciprocal rank com a similaridade dos vetores),
+    até `top_k` avaliações e `token_budget` tokens. Sem nenhum termo da
+    pergunta nas avaliações, mantém a ordem original. Retorna as avaliações
+    selecionadas na ordem de relevância.
+    """
+    texts = list(texts)
+    index = load_book_index(texts, use_dense=use_dense)
+    scores = bm25_scores(index, question)
+
+    if 'vectors' in index:
+        dense_scores = np.asarray(index['vectors']) @ _load_dense_model().encode([question], normalize_embeddings=True)[0]
+        fused = np.zeros(len(texts))
+        for ranking in [_rank(scores), _rank(dense_scores)]:
+            fused[ranking] += 1 / (RRF_K + np.arange(1, len(texts) + 1))
+        order = _rank(fused)
+    elif scores.any():
+        order = _rank(scores)
+    else:
+        order = np.arange(len(texts))
+
+    selected, used_tokens = [], 0
+    for position in order[:top_k]:
+        tokens = count_tokens(texts[position])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(texts[position])
+        used_tokens += tokens
+    return selected
@@ -0,0 +1,89 @@
+import numpy as np
+from src.retrieval import approx_token_count
+
+SUMMARY_TOKEN_BUDGET = 1500
+SUMMARY_MAX_REVIEWS = 40
+NEAR_DUPLICATE_JACCARD = 0.8
+# Nenhuma avaliação sozinha ocupa mais que esta fração do orçamento.
+MAX_REVIEW_SHARE = 0.25
+# Com o orçamento quase cheio, para depois de tantas avaliações seguidas que não cabem.
+MAX_BUDGET_MISSES = 50
+
+def token_counter_for(llm):
+    """
+    Função que conta os tokens de uma avaliação como ela entra no prompt
+    ("- " + texto), usando o tokenizer do LLM (ou do seu pipeline do
+    HuggingFace) quando ele tem um, e a estimativa por palavras caso contrário.
+    """
+    tokenizer = getattr(llm, 'tokenizer', None) or getattr(getattr(llm, 'pipeline', None), 'tokenizer', None)
+    if tokenizer is None:
+        return approx_token_count
+    return lambda text: len(tokenizer.encode("- " + text + "\n", add_special_tokens=False))
+
+def _helpful_votes(book_df):
+    if 'review/helpfulness' not in book_df:
+        return np.zeros(len(book_df))
+    votes = book_df['review/helpfulness'].astype(str).str.split('/', n=1).str[0]
+    return np.nan_to_num(votes.str.extract(r'^(\d+)$')[0].astype(float).to_numpy())
+
+def _is_near_duplicate(words, selected_words):
+    for other in selected_words:
+        union = len(words | other)
+        if union and len(words & other) / union >= NEAR_DUPLICATE_JACCARD:
+            return True
+    return False
+
+def select_representative_reviews(book_df, token_budget=SUMMARY_TOKEN_BUDGET, max_reviews=SUMMARY_MAX_REVIEWS,
+                                  count_tokens=approx_token_count):
+    """
+    Amostra de avaliações que cobre a recepção do livro inteiro dentro de um
+    orçamento de tokens:
+    - estratificada por nota: as notas de 1 a 5 se alternam com peso
+      proporcional à raiz do número de avaliações de cada uma, para que notas
+      minoritárias apareçam sem dominar a amostra;
+    - dentro de cada nota, as avaliações com mais votos de utilidade primeiro;
+    - sem textos vazios, repetidos ou quase repetidos (Jaccard das palavras);
+    - empacotada até `token_budget`, medido com `count_tokens`.
+    Só as avaliações candidatas são tokenizadas, então o custo depende do
+    tamanho da amostra e não do número de avaliações do livro.
+    """
+    texts = book_df['cleaned_review_text'].to_numpy()
+    scores = book_df['score'].to_numpy()
+    order = np.lexsort((np.arange(len(book_df)), -_helpful_votes(book_df)))
+
+    queues, weights = {}, {}
+    for score in np.unique(scores[~np.isnan(scores)]):
+        queue = order[scores[order] == score]
+        queues[score] = list(queue[::-1])
+        weights[score] = np.sqrt(len(queue))
+    picked = {score: 0 for score in queues}
+
+    selected, selected_words, seen_texts, used_tokens, budget_misses = [], [], set(), 0, 0
+    max_review_tokens = token_budget * MAX_REVIEW_SHARE
+    while queues and len(selected) < max_reviews and budget_misses < MAX_BUDGET_MISSES:
+        # Nota com menos avaliações escolhidas em relação ao seu peso.
+        score = min(queues, key=lambda s: (picked[s] / weights[s], s))
+        position = queues[score].pop()
+        if not queues[score]:
+            del queues[score]
+
+        text = texts[position]
+        if not text or text in seen_texts:
+            continue
+        seen_texts.add(text)
+        words = set(text.split())
+        if _is_near_duplicate(words, selected_words):
+            continue
+        tokens = count_tokens(text)
+        if tokens > max_review_tokens:
+            continue
+        if used_tokens + tokens > token_budget:
+            budget_misses += 1
+            continue
+
+        selected.append(text)
+        selected_words.append(words)
+        picked[score] += 1
+        used_tokens += tokens
+        budget_misses = 0
+    return selected
@@ -0,0 +1,155 @@
+import glob
+import itertools
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from src.data_processing import data_version, totals_to_stats
+from src.profiling import profiled
+
+TRENDS_DIR = 'data/.cache/trends'
+# Dimensão da tendência -> coluna do DataFrame preparado.
+TREND_DIMENSIONS = {'book': 'Title', 'author': 'authors', 'category': 'categories'}
+# Granularidades das consultas; as partições são sempre mensais.
+TREND_PERIODS = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+ROLLUP_COLUMNS = ['dimension', 'label', 'count', 'total', 'total_sq']
+
+def _score_totals(df, by):
+    return df.assign(score_sq=df['score'] ** 2).groupby(by, observed=True).agg(
+        count=('score', 'count'),
+        total=('score', 'sum'),
+        total_sq=('score_sq', 'sum')
+    )
+
+def build_rollups(df):
+    """
+    Totais das notas (contagem, soma e soma dos quadrados) por mês de
+    avaliação e por livro, autor e categoria, num único DataFrame longo com
+    as colunas month ("AAAA-MM"), dimension, label e os totais.
+    """
+    df = df[df['review_time'].notna()]
+    months = df['review_time'].dt.year * 100 + df['review_time'].dt.month
+    base = pd.DataFrame({'month': months.to_numpy(), 'score': df['score'].to_numpy()})
+
+    parts = []
+    for dimension, column in TREND_DIMENSIONS.items():
+        values = df[column]
+        if column in ['authors', 'categories']:
+            # Um rótulo repetido na mesma lista conta uma vez só para aquela avaliação, como em build_list_index.
+            values = values.map(lambda labels: list(dict.fromkeys(labels)))
+            lengths = values.map(len).to_numpy()
+            labels = pd.Series(list(itertools.chain.from_iterable(values)), dtype=object)
+            dim_df = base.iloc[np.repeat(np.arange(len(base)), lengths)].reset_index(drop=True)
+        else:
+            labels, dim_df = values.reset_index(drop=True), base
+        totals = _score_totals(dim_df.assign(label=labels.astype(str).to_numpy()), ['month', 'label']).reset_index()
+        parts.append(totals.assign(dimension=dimension))
+
+    rollups = pd.concat(parts, ignore_index=True)
+    rollups['month'] = (rollups['month'] // 100).astype(str) + '-' + (rollups['month'] % 100).map('{:02d}'.format)
+    return rollups[['month'] + ROLLUP_COLUMNS]
+
+def trend_store_path(use_sample=True, store_dir=TRENDS_DIR):
+    return os.path.join(store_dir, data_version(use_sample))
+
+def _partition_path(path, month):
+    year, month_number = month.split('-')
+    return os.path.join(path, year, f'{month_number}.arrow')
+
+def _write_partition(part, file_path):
+    part = part.sort_values(['dimension', 'label'], kind='stable')[ROLLUP_COLUMNS].reset_index(drop=True)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = file_path + '.tmp'
+    # Sem compressão, para que query_trend leia as partições com memory-map sem descomprimir.
+    part.to_feather(tmp_path, compression='uncompressed')
+    os.replace(tmp_path, file_path)
+
+@profiled(name='build_trend_store')
+def build_trend_store(df, use_sample=True, store_dir=TRENDS_DIR):
+    """
+    Grava as rollups de build_rollups particionadas por mês de avaliação
+    ({ano}/{mês}.arrow), uma pasta por versão dos dados preparados, e remove
+    as pastas de versões antigas. Se a versão atual já existe, só retorna o
+    caminho. Retorna None se não for possível gravar.
+    """
+    path = trend_store_path(use_sample, store_dir)
+    if os.path.isdir(path):
+        return path
+
+    tmp_path = path + '.tmp'
+    try:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        for month, part in build_rollups(df).groupby('month'):
+            _write_partition(part, _partition_path(tmp_path, month))
+        os.makedirs(tmp_path, exist_ok=True)
+        os.replace(tmp_path, path)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Não foi possível gravar as tendências em {path}: {e}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return None
+
+    name = os.path.basename(path).rsplit('_', 1)[0]
+    for stale_path in glob.glob(os.path.join(store_dir, f'{name}_' + '[0-9a-f]' * 16)):
+        if stale_path != path:
+            shutil.rmtree(stale_path, ignore_errors=True)
+    return path
+
+def update_trend_store(new_reviews, use_sample=True, store_dir=TRENDS_DIR):
+    """
+    Soma os totais de um lote de avaliações já preparadas às partições dos
+    meses em que ele cai, sem tocar nas demais. Sem loja gravada para a
+    versão atual dos dados, não faz nada (ela será construída do DataFrame
+    completo na próxima carga).
+    """
+    path = trend_store_path(use_sample, store_dir)
+    if not os.path.isdir(path):
+        return
+    try:
+        for month, part in build_rollups(new_reviews).groupby('month'):
+            file_path = _partition_path(path, month)
+            if os.path.exists(file_path):
+                part = pd.concat([pd.read_feather(file_path), part[ROLLUP_COLUMNS]], ignore_index=True)
+                part = part.groupby(['dimension', 'label'], as_index=False)[['count', 'total', 'total_sq']].sum()
+            _write_partition(part, file_path)
+    except (ImportError, OSError, ValueError) as e:
+        # Uma partição desatualizada daria totais errados: melhor reconstruir tudo na próxima carga.
+        print(f"Não foi possível atualizar as tendências em {path}: {e}")
+        shutil.rmtree(path, ignore_errors=True)
+
+def store_months(path):
+    """Meses com partição na loja, em ordem ("AAAA-MM")."""
+    months = []
+    for year in sorted(os.listdir(path)):
+        if year.isdigit():
+            months.extend(f'{year}-{name[:-len(".arrow")]}' for name in sorted(os.listdir(os.path.join(path, year)))
+                          if name.endswith('.arrow'))
+    return months
+
+def query_trend(path, dimension, label, start=None, end=None, period='month'):
+    """
+    Número de avaliações, nota média e desvio padrão de um livro, autor ou
+    categoria (`dimension` em TREND_DIMENSIONS) por mês, trimestre ou ano,
+    entre os meses `start` e `end` ("AAAA-MM", inclusivos). Só as partições
+    do intervalo são lidas, com memory-map, e de cada uma só as linhas do
+    rótulo pedido são convertidas.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+
+    months = [month for month in store_months(path) if (start is None or month >= start) and (end is None or month <= end)]
+    found_months, parts = [], []
+    for month in months:
+        table = feather.read_table(_partition_path(path, month), memory_map=True)
+        mask = pc.and_(pc.equal(table['dimension'], dimension), pc.equal(table['label'], str(label)))
+        rows = table.filter(mask)
+        if rows.num_rows:
+            found_months.append(month)
+            parts.append(rows.select(['count', 'total', 'total_sq']).to_pandas())
+
+    if not parts:
+        return pd.DataFrame(columns=['num_reviews', 'avg_score', 'score_std'])
+    totals = pd.concat(parts, ignore_index=True)
+    periods = pd.PeriodIndex(np.repeat(found_months, [len(part) for part in parts]), freq='M').asfreq(TREND_PERIODS[period])
+    totals = totals.groupby(periods.astype(str)).sum()
+    stats = totals_to_stats(totals)
+    return pd.DataFrame({'num_reviews': stats['count'].astype('int64'), 'avg_score': stats['mean'], 'score_std': stats['std']})